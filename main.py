@@ -25,7 +25,10 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client
 
 from plugins import glovar
-from plugins.functions.timers import backup_files, interval_hour_01, reset_count, update_status
+from plugins.functions.channel import share_regex_updates
+from plugins.functions.file import save_files
+from plugins.functions.timers import backup_files, dedupe_rules, interval_hour_01, reset_count, update_regex
+from plugins.functions.timers import update_status
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -46,6 +49,10 @@ scheduler.add_job(interval_hour_01, "interval", [app], hours=1)
 scheduler.add_job(update_status, "cron", [app, "awake"], minute=30)
 scheduler.add_job(backup_files, "cron", [app], hour=20)
 scheduler.add_job(reset_count, "cron", [app], hour=20, minute=30)
+scheduler.add_job(update_regex, "cron", [app], hour=21)
+scheduler.add_job(dedupe_rules, "cron", hour=21, minute=30)
+scheduler.add_job(save_files, "interval", seconds=glovar.save_interval)
+scheduler.add_job(share_regex_updates, "interval", [app], seconds=glovar.share_interval)
 scheduler.start()
 
 # Hold
@@ -53,3 +60,7 @@ app.idle()
 
 # Stop
 app.stop()
+
+# Save
+scheduler.shutdown()
+save_files()
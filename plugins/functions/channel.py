@@ -18,13 +18,14 @@
 
 import logging
 from json import dumps
-from typing import List, Union
+from typing import Any, Iterable, List, Tuple, Union
 
 from pyrogram import Client
 
 from .. import glovar
 from .etc import code, code_block, lang, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path
+from .file import bytes_to_file, compress_data, crypt_data, data_to_bytes, delete_file
+from .store import rules
 from .telegram import send_document, send_message
 
 # Enable logging
@@ -57,7 +58,7 @@ def exchange_to_hide(client: Client) -> bool:
 
 
 def format_data(sender: str, receivers: List[str], action: str, action_type: str,
-                data: Union[bool, dict, int, str] = None) -> str:
+                data: Union[bool, dict, int, str] = None, compress: str = "") -> str:
     # See https://scp-079.org/exchange/
     text = ""
     try:
@@ -66,7 +67,8 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
             "to": receivers,
             "action": action,
             "type": action_type,
-            "data": data
+            "data": data,
+            "compress": compress
         }
         text = code_block(dumps(data, indent=4))
     except Exception as e:
@@ -76,7 +78,8 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
 
 
 def share_data(client: Client, receivers: List[str], action: str, action_type: str,
-               data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
+               data: Union[bool, dict, int, str] = None, file: Union[bytes, str] = None,
+               encrypt: bool = True) -> bool:
     # Use this function to share data in the channel
     try:
         thread(
@@ -92,7 +95,8 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
 
 
 def share_data_thread(client: Client, receivers: List[str], action: str, action_type: str,
-                      data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
+                      data: Union[bool, dict, int, str] = None, file: Union[bytes, str] = None,
+                      encrypt: bool = True) -> bool:
     # Share data thread
     try:
         if glovar.sender in receivers:
@@ -107,28 +111,54 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
             channel_id = glovar.exchange_channel_id
 
         if file:
+            # Compress only if all the receivers have told that they can decompress
+            if (isinstance(file, bytes) or encrypt) and all(r in glovar.decompressors for r in receivers):
+                compress = glovar.compress
+            else:
+                compress = ""
+
+            if isinstance(file, bytes) or encrypt:
+                # Encrypt in memory, only the uploaded file is saved to the tmp directory
+                if isinstance(file, bytes):
+                    content = file
+                else:
+                    with open(file, "rb") as f:
+                        content = f.read()
+
+                # Sent as it is if the compression failed, the text must not name the method then
+                compressed = compress and compress_data(compress, content)
+
+                if compressed:
+                    content = compressed
+                else:
+                    compress = ""
+
+                # Never fall back to the plain content
+                if encrypt:
+                    content = crypt_data("encrypt", content)
+
+                    if not content:
+                        logger.warning(f"Share data {action} {action_type} aborted, encryption failed")
+                        return False
+
+                file_path = bytes_to_file(content)
+            else:
+                # Send directly
+                file_path = file
+
             text = format_data(
                 sender=glovar.sender,
                 receivers=receivers,
                 action=action,
                 action_type=action_type,
-                data=data
+                data=data,
+                compress=compress
             )
 
-            if encrypt:
-                # Encrypt the file, save to the tmp directory
-                file_path = get_new_path()
-                crypt_file("encrypt", file, file_path)
-            else:
-                # Send directly
-                file_path = file
-
             result = send_document(client, channel_id, file_path, None, text)
 
             # Delete the tmp file
-            if result:
-                for f in {file, file_path}:
-                    f.startswith("tmp/") and thread(delete_file, (f,))
+            file_path != file and thread(delete_file, (file_path,))
         else:
             text = format_data(
                 sender=glovar.sender,
@@ -152,21 +182,199 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
     return False
 
 
-def share_regex_update(client: Client, word_type: str) -> bool:
+def get_caption_length(updates: List[Tuple[str, str, Any, Any, str]]) -> int:
+    # Get the length of the bundle's caption, with all the receivers and the longest compress name
+    result = 0
+    try:
+        receivers = {r for update in updates for r in glovar.receivers[update[0]]}
+        result = len(dumps({
+            "from": glovar.sender,
+            "to": sorted(receivers),
+            "action": "regex",
+            "type": "bundle",
+            "data": [f"{update[0]}_words" for update in updates],
+            "compress": glovar.compress
+        }, indent=4))
+    except Exception as e:
+        logger.warning(f"Get caption length error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_update(word_type: str, full: bool = False) -> (str, Union[dict, str], Any, str):
+    # Get the action type, data, file content and content hash of the type's regex update
+    result = ("", None, None, "")
+    glovar.locks["regex"].acquire_read()
+    try:
+        # Built under the read lock, the content is copied to plain dicts before the writers go on
+        update = glovar.updates[word_type]
+        words = rules[word_type]
+        digest = rules.digest(word_type)
+
+        # Delta since the last version, a receiver applies it only if its version is the base,
+        # or it has just loaded a full update, otherwise it should request a full update
+        if not full and update["version"] and all(r in glovar.deltas for r in glovar.receivers[word_type]):
+            if not update["added"] and not update["removed"]:
+                return result
+
+            added, update["added"] = update["added"], set()
+            removed, update["removed"] = update["removed"], set()
+            update["version"] += 1
+            data = {
+                "type": f"{word_type}_words",
+                "base": update["version"] - 1,
+                "version": update["version"],
+                "hash": digest
+            }
+            content = {
+                "added": {w: dict(words[w]) for w in added if w in words},
+                "removed": list(removed)
+            }
+
+            return "delta", data, content, digest
+
+        # Every receiver has acknowledged the same content
+        if all(update["acks"].get(receiver) == digest for receiver in glovar.receivers[word_type]):
+            update["added"] = set()
+            update["removed"] = set()
+            return result
+
+        # Full update, contains all the changes until now
+        update["added"] = set()
+        update["removed"] = set()
+        update["version"] += 1
+        update["full"] = update["version"]
+        result = ("update", f"{word_type}_words", {w: dict(words[w]) for w in words}, digest)
+    except Exception as e:
+        logger.warning(f"Get regex update error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release_read()
+
+    return result
+
+
+def share_regex_update(client: Client, word_type: str, full: bool = False, receivers: List[str] = None) -> bool:
     # Use this function to share regex update to other bots
     try:
-        file = data_to_file(eval(f"glovar.{word_type}_words"))
-        share_data(
-            client=client,
-            receivers=glovar.receivers[word_type],
-            action="regex",
-            action_type="update",
-            data=f"{word_type}_words",
-            file=file
-        )
+        # Reply to a single receiver directly, copy the rules under the read lock
+        if receivers:
+            glovar.locks["regex"].acquire_read()
+            try:
+                words = rules[word_type]
+                file = data_to_bytes({w: dict(words[w]) for w in words})
+            finally:
+                glovar.locks["regex"].release_read()
+
+            share_data(
+                client=client,
+                receivers=receivers,
+                action="regex",
+                action_type="update",
+                data=f"{word_type}_words",
+                file=file
+            )
+
+            return True
+
+        # Shared together with other types by share_regex_updates
+        glovar.shares[word_type] = glovar.shares.get(word_type, False) or full
 
         return True
     except Exception as e:
         logger.warning(f"Share regex update error: {e}", exc_info=True)
 
     return False
+
+
+def share_regex_updates(client: Client) -> bool:
+    # Share the marked regex updates, in bundles to the receivers that can apply them
+    try:
+        updates = []
+
+        for word_type in list(glovar.shares):
+            full = glovar.shares.pop(word_type, False)
+            action_type, data, content, digest = get_regex_update(word_type, full)
+            action_type and updates.append((word_type, action_type, data, content, digest))
+
+        bundles = []
+
+        for update in updates:
+            word_type, action_type, data, content, _ = update
+            receivers = [r for r in glovar.receivers[word_type] if r not in glovar.deltas]
+
+            # The older receivers only understand the update of a single type, a delta is never made for them
+            if receivers:
+                share_data(
+                    client=client,
+                    receivers=receivers,
+                    action="regex",
+                    action_type=action_type,
+                    data=data,
+                    file=data_to_bytes(content)
+                )
+
+            if len(receivers) < len(glovar.receivers[word_type]):
+                bundles.append(update)
+
+        # The bundle's data tells every receiver which types it contains, so it can skip the download,
+        # the types are split into chunks to keep the caption under the limit
+        chunks = []
+
+        for update in bundles:
+            if chunks and get_caption_length(chunks[-1] + [update]) <= 1024:
+                chunks[-1].append(update)
+            else:
+                chunks.append([update])
+
+        for chunk in chunks:
+            receivers = sorted({r for update in chunk for r in glovar.receivers[update[0]] if r in glovar.deltas})
+
+            if len(chunk) == 1:
+                word_type, action_type, data, content, _ = chunk[0]
+                share_data(
+                    client=client,
+                    receivers=receivers,
+                    action="regex",
+                    action_type=action_type,
+                    data=data,
+                    file=data_to_bytes(content)
+                )
+                continue
+
+            file = data_to_bytes({f"{update[0]}_words": {"type": update[1], "data": update[2], "content": update[3],
+                                                         "hash": update[4]}
+                                  for update in chunk})
+            share_data(
+                client=client,
+                receivers=receivers,
+                action="regex",
+                action_type="bundle",
+                data=[f"{update[0]}_words" for update in chunk],
+                file=file
+            )
+
+        return True
+    except Exception as e:
+        logger.warning(f"Share regex updates error: {e}", exc_info=True)
+
+    return False
+
+
+def update_regex_delta(word_type: str, added: Iterable[str] = (), removed: Iterable[str] = ()) -> bool:
+    # Record the changed words, they will be shared in the next delta
+    try:
+        update = glovar.updates[word_type]
+
+        for word in added:
+            update["removed"].discard(word)
+            update["added"].add(word)
+
+        for word in removed:
+            update["added"].discard(word)
+            update["removed"].add(word)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update regex delta error: {e}", exc_info=True)
+
+    return False
@@ -0,0 +1,498 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from bisect import bisect_left, bisect_right
+from collections import deque
+from functools import lru_cache
+from hashlib import sha256
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+try:
+    from _sre import unicode_tolower
+except ImportError:
+    def unicode_tolower(c: int) -> int:
+        lower = chr(c).lower()
+        return ord(lower) if len(lower) == 1 else c
+
+try:
+    from re._casefix import _EXTRA_CASES as fixes
+except ImportError:
+    try:
+        from sre_compile import _ignorecase_fixes as fixes
+    except ImportError:
+        fixes = {}
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# A set of characters: sorted, disjoint and half open intervals of the universe's indexes
+Intervals = List[Tuple[int, int]]
+
+# A DFA: atom bounds, transition table, accepting states, the start state is 0
+Dfa = Tuple[List[int], List[List[int]], List[bool]]
+
+# Limits of the automata, larger rules are left to sampling
+MAX_NFA = 5000
+MAX_DFA = 2000
+
+# Categories of the character classes
+categories: Dict[str, str] = {
+    "CATEGORY_DIGIT": r"\d",
+    "CATEGORY_NOT_DIGIT": r"\D",
+    "CATEGORY_SPACE": r"\s",
+    "CATEGORY_NOT_SPACE": r"\S",
+    "CATEGORY_WORD": r"\w",
+    "CATEGORY_NOT_WORD": r"\W"
+}
+
+# Flags that do not change the language under re.I | re.M | re.S
+flags_allowed = re.I | re.M | re.S | re.U | re.X
+
+
+@lru_cache(maxsize=1)
+def get_universe() -> Tuple[Intervals, List[int]]:
+    # Get the runs of the characters that are their own lowercase, re.I compares every character by its lowercase,
+    # and the index of every run's first character in the universe, the last one is the size of the universe
+    runs = []
+    offsets = [0]
+    start = None
+
+    for c in range(0x110001):
+        if c < 0x110000 and unicode_tolower(c) == c:
+            if start is None:
+                start = c
+        elif start is not None:
+            runs.append((start, c))
+            offsets.append(offsets[-1] + c - start)
+            start = None
+
+    return runs, offsets
+
+
+@lru_cache(maxsize=1)
+def get_text() -> str:
+    # Get the characters of the universe in order, scanned by the character classes
+    runs, _ = get_universe()
+
+    return "".join("".join(map(chr, range(low, high))) for low, high in runs)
+
+
+@lru_cache(maxsize=4096)
+def get_class(source: str) -> Intervals:
+    # Get the characters matched by a character class
+    pattern = re.compile(f"(?:{source})+", re.I | re.M | re.S)
+
+    return [m.span() for m in pattern.finditer(get_text())]
+
+
+@lru_cache(maxsize=4096)
+def get_char(c: int) -> Intervals:
+    # Get the characters matched by a literal character
+    pattern = re.compile(re.escape(chr(c)), re.I | re.M | re.S)
+    lower = unicode_tolower(c)
+    candidates = {c, lower} | set(fixes.get(lower, ()))
+
+    for text in (chr(c).lower(), chr(c).upper()):
+        if len(text) == 1:
+            candidates.add(unicode_tolower(ord(text)))
+
+    result = []
+
+    for candidate in sorted(candidates):
+        i = get_index(candidate)
+
+        if i is not None and pattern.fullmatch(chr(candidate)):
+            result.append((i, i + 1))
+
+    return result
+
+
+@lru_cache(maxsize=8192)
+def get_dfa(word: str, search: bool = True) -> Optional[Dfa]:
+    # Get the minimal DFA of the rule, of the texts it finds if search, None if the rule is not regular
+    result = None
+    try:
+        parsed = sre_parse.parse(word, re.I | re.M | re.S)
+
+        # The parser's state is named pattern before Python 3.8
+        state = parsed.state if hasattr(parsed, "state") else parsed.pattern
+
+        if state.flags & ~flags_allowed:
+            return None
+
+        nfa = Nfa()
+        start, end = nfa.sequence(parsed)
+        result = nfa.compile(start, end, search)
+    except (RecursionError, ValueError) as e:
+        logger.info(f"Get DFA of {word}: {e}")
+    except Exception as e:
+        logger.warning(f"Get DFA of {word} error: {e}", exc_info=True)
+
+    return result
+
+
+@lru_cache(maxsize=65536)
+def get_form(word: str) -> Optional[str]:
+    # Get the hash of the rule's minimal search DFA, equivalent rules have the same one, None if not regular
+    result = None
+    try:
+        # Not cached by get_dfa, the forms of all rules would evict the DFAs in use
+        dfa = get_dfa.__wrapped__(word)
+
+        if dfa is None:
+            return None
+
+        # Number the states in the order of a breadth first walk, so the same language gives the same table
+        bounds, table, accepting = dfa
+        numbers = {0: 0}
+        order = [0]
+
+        for state in order:
+            for target in table[state]:
+                if target not in numbers:
+                    numbers[target] = len(numbers)
+                    order.append(target)
+
+        form = (bounds, [[numbers[t] for t in table[state]] for state in order], [accepting[s] for s in order])
+        result = sha256(repr(form).encode("utf-8")).hexdigest()[:32]
+    except Exception as e:
+        logger.warning(f"Get form of {word} error: {e}", exc_info=True)
+
+    return result
+
+
+def get_index(c: int) -> Optional[int]:
+    # Get the index of the character in the universe, None if it is not in the universe
+    runs, offsets = get_universe()
+    i = bisect_right(runs, (c, 0x110000)) - 1
+
+    if i < 0 or c >= runs[i][1]:
+        return None
+
+    return offsets[i] + c - runs[i][0]
+
+
+@lru_cache(maxsize=65536)
+def is_contained(a: str, b: str) -> Optional[bool]:
+    # Check if rule a finds every text that rule b finds, None if unknown
+    result = None
+    try:
+        dfa_a = get_dfa(a)
+        dfa_b = get_dfa(b)
+
+        if dfa_a is None or dfa_b is None:
+            return None
+
+        result = not any(accept_b and not accept_a for accept_a, accept_b in walk_product(dfa_a, dfa_b))
+    except Exception as e:
+        logger.warning(f"Is contained {a} {b} error: {e}", exc_info=True)
+
+    return result
+
+
+def is_equivalent(a: str, b: str) -> Optional[bool]:
+    # Check if the rules find the same texts, None if unknown
+    result = is_contained(a, b)
+
+    if result:
+        result = is_contained(b, a)
+
+    return result
+
+
+@lru_cache(maxsize=65536)
+def is_overlapped(a: str, b: str) -> Optional[bool]:
+    # Check if a text can be fully matched by both rules, None if unknown
+    result = None
+    try:
+        dfa_a = get_dfa(a, False)
+        dfa_b = get_dfa(b, False)
+
+        if dfa_a is None or dfa_b is None:
+            return None
+
+        result = any(accept_a and accept_b for accept_a, accept_b in walk_product(dfa_a, dfa_b))
+    except Exception as e:
+        logger.warning(f"Is overlapped {a} {b} error: {e}", exc_info=True)
+
+    return result
+
+
+def minimize(table: List[List[int]], accepting: List[bool]) -> Tuple[List[List[int]], List[bool]]:
+    # Merge the equivalent states, Moore's algorithm, keep the start state as 0
+    blocks = [int(accept) for accept in accepting]
+    count = len(set(blocks))
+
+    while True:
+        signatures = {}
+        new_blocks = []
+
+        for state, row in enumerate(table):
+            signature = (blocks[state], tuple(blocks[target] for target in row))
+            new_blocks.append(signatures.setdefault(signature, len(signatures)))
+
+        if len(signatures) == count:
+            break
+
+        blocks = new_blocks
+        count = len(signatures)
+
+    # Number the blocks from the start state
+    numbers = {}
+
+    for block in [blocks[0]] + blocks:
+        numbers.setdefault(block, len(numbers))
+
+    new_table: List[Optional[List[int]]] = [None] * len(numbers)
+    new_accepting = [False] * len(numbers)
+
+    for state, row in enumerate(table):
+        number = numbers[blocks[state]]
+
+        if new_table[number] is None:
+            new_table[number] = [numbers[blocks[target]] for target in row]
+            new_accepting[number] = accepting[state]
+
+    return new_table, new_accepting
+
+
+def walk_product(dfa_a: Dfa, dfa_b: Dfa) -> Iterable[Tuple[bool, bool]]:
+    # Walk the reachable states of the product automaton, yield their accepting flags
+    bounds_a, table_a, accepting_a = dfa_a
+    bounds_b, table_b, accepting_b = dfa_b
+    points = sorted(set(bounds_a[:-1]) | set(bounds_b[:-1]))
+    atoms = [(bisect_right(bounds_a, p) - 1, bisect_right(bounds_b, p) - 1) for p in points]
+    atoms = list(set(atoms))
+    visited = {(0, 0)}
+    queue = deque(visited)
+
+    while queue:
+        state_a, state_b = queue.popleft()
+        yield accepting_a[state_a], accepting_b[state_b]
+
+        row_a = table_a[state_a]
+        row_b = table_b[state_b]
+
+        for atom_a, atom_b in atoms:
+            pair = (row_a[atom_a], row_b[atom_b])
+
+            if pair not in visited:
+                visited.add(pair)
+                queue.append(pair)
+
+
+class Nfa:
+    # Thompson's construction of the regular subset of the rules
+    def __init__(self) -> None:
+        self.edges: List[List[Tuple[Intervals, int]]] = []
+        self.epsilons: List[List[int]] = []
+
+    def add(self) -> int:
+        # Add a state
+        if len(self.epsilons) >= MAX_NFA:
+            raise ValueError("too many NFA states")
+
+        self.edges.append([])
+        self.epsilons.append([])
+
+        return len(self.epsilons) - 1
+
+    def branch(self, branches: List[list]) -> Tuple[int, int]:
+        # Any of the sequences
+        start = self.add()
+        end = self.add()
+
+        for items in branches:
+            s, e = self.sequence(items)
+            self.epsilons[start].append(s)
+            self.epsilons[e].append(end)
+
+        return start, end
+
+    def char(self, chars: Intervals) -> Tuple[int, int]:
+        # One character of the set
+        start = self.add()
+        end = self.add()
+        self.edges[start].append((chars, end))
+
+        return start, end
+
+    def closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        # Get the states reachable by epsilons
+        result = set(states)
+        stack = list(result)
+
+        while stack:
+            for target in self.epsilons[stack.pop()]:
+                if target not in result:
+                    result.add(target)
+                    stack.append(target)
+
+        return frozenset(result)
+
+    def compile(self, start: int, end: int, search: bool) -> Dfa:
+        # Subset construction, a search DFA finds the rule anywhere and accepts forever once found
+        universe = get_universe()[1][-1]
+        bounds = sorted({0, universe} | {p for edges in self.edges for chars, _ in edges for i in chars for p in i})
+
+        # The atoms are the intervals between the bounds, every character set is a union of atoms
+        moves: List[List[Tuple[int, int]]] = []
+
+        for edges in self.edges:
+            moves.append([(atom, target)
+                          for chars, target in edges
+                          for low, high in chars
+                          for atom in range(bisect_left(bounds, low), bisect_left(bounds, high))])
+
+        initial = self.closure([start])
+        ids: Dict[FrozenSet[int], int] = {initial: 0}
+        subsets = [initial]
+        table: List[List[int]] = []
+        accepting: List[bool] = []
+
+        while len(table) < len(subsets):
+            subset = subsets[len(table)]
+            accept = end in subset
+            row = [len(table)] * (len(bounds) - 1)
+
+            if not (search and accept):
+                targets: List[Set[int]] = [set() for _ in row]
+
+                for state in subset:
+                    for atom, target in moves[state]:
+                        targets[atom].add(target)
+
+                for atom, states in enumerate(targets):
+                    if search:
+                        states.add(start)
+
+                    key = self.closure(states)
+
+                    if key not in ids:
+                        if len(subsets) >= MAX_DFA:
+                            raise ValueError("too many DFA states")
+
+                        ids[key] = len(subsets)
+                        subsets.append(key)
+
+                    row[atom] = ids[key]
+
+            table.append(row)
+            accepting.append(accept)
+
+        table, accepting = minimize(table, accepting)
+
+        # Merge the adjacent atoms with the same transitions
+        columns = list(zip(*table))
+        keep = [0] + [i for i in range(1, len(columns)) if columns[i] != columns[i - 1]]
+        bounds = [bounds[i] for i in keep] + [bounds[-1]]
+        table = [[row[i] for i in keep] for row in table]
+
+        return bounds, table, accepting
+
+    def piece(self, op, av) -> Tuple[int, int]:
+        # Get the fragment of a parsed item
+        name = op.name
+
+        if name == "LITERAL":
+            return self.char(get_char(av))
+        elif name == "NOT_LITERAL":
+            return self.char(get_class(f"[^\\U{av:08x}]"))
+        elif name == "ANY":
+            return self.char([(0, get_universe()[1][-1])])
+        elif name == "CATEGORY":
+            return self.char(get_class(categories[av.name]))
+        elif name == "IN":
+            return self.char(get_class(get_class_source(av)))
+        elif name == "BRANCH":
+            return self.branch(av[1])
+        elif name == "SUBPATTERN":
+            if av[1] & ~flags_allowed or av[2]:
+                raise ValueError("unsupported flags")
+
+            return self.sequence(av[-1])
+        elif name in {"MAX_REPEAT", "MIN_REPEAT"}:
+            return self.repeat(*av)
+
+        raise ValueError(f"unsupported {name}")
+
+    def repeat(self, low: int, high: int, items: list) -> Tuple[int, int]:
+        # Repeated sequence, the lazy and greedy repeats find the same texts
+        start = end = self.add()
+
+        for _ in range(low):
+            s, e = self.sequence(items)
+            self.epsilons[end].append(s)
+            end = e
+
+        if high is sre_parse.MAXREPEAT:
+            s, e = self.sequence(items)
+            self.epsilons[end].append(s)
+            self.epsilons[e].append(end)
+
+            return start, end
+
+        last = self.add()
+        self.epsilons[end].append(last)
+
+        for _ in range(high - low):
+            s, e = self.sequence(items)
+            self.epsilons[end].append(s)
+            self.epsilons[e].append(last)
+            end = e
+
+        return start, last
+
+    def sequence(self, items: list) -> Tuple[int, int]:
+        # Concatenation of the items
+        start = end = self.add()
+
+        for op, av in items:
+            s, e = self.piece(op, av)
+            self.epsilons[end].append(s)
+            end = e
+
+        return start, end
+
+
+def get_class_source(items: Iterable[Tuple]) -> str:
+    # Rebuild the source of a character class
+    result = ""
+
+    for op, av in items:
+        name = op.name
+
+        if name == "NEGATE":
+            result += "^"
+        elif name == "LITERAL":
+            result += f"\\U{av:08x}"
+        elif name == "RANGE":
+            result += f"\\U{av[0]:08x}-\\U{av[1]:08x}"
+        elif name == "CATEGORY":
+            result += categories[av.name]
+        else:
+            raise ValueError(f"unsupported {name} in class")
+
+    return f"[{result}]"
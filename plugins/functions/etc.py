@@ -22,7 +22,6 @@ from html import escape
 from json import dumps, loads
 from random import choice, uniform
 from string import ascii_letters, digits
-from threading import Thread, Timer
 from time import localtime, sleep, strftime, time
 from typing import Any, Callable, List, Optional, Union
 from unicodedata import normalize
@@ -33,6 +32,7 @@ from pyrogram import InlineKeyboardButton, InlineKeyboardMarkup, Message, User
 from pyrogram.errors import FloodWait
 
 from .. import glovar
+from .pool import pool
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -116,9 +116,7 @@ def crypt_str(operation: str, text: str, key: bytes) -> str:
 def delay(secs: int, target: Callable, args: list) -> bool:
     # Call a function with delay
     try:
-        t = Timer(secs, target, args)
-        t.daemon = True
-        t.start()
+        pool.delay(secs, get_queue(target), target, tuple(args))
 
         return True
     except Exception as e:
@@ -385,6 +383,25 @@ def get_now() -> int:
     return result
 
 
+def get_queue(target: Callable) -> str:
+    # Get the name of the pool's queue for the function
+    result = "cpu"
+    try:
+        module = target.__module__.split(".")[-1]
+
+        # The exchange tasks wait for their sends, so they do not share the workers of the other sends
+        if module == "channel":
+            result = "exchange"
+        elif module == "telegram":
+            result = "telegram"
+        elif module == "file":
+            result = "io"
+    except Exception as e:
+        logger.warning(f"Get queue error: {e}", exc_info=True)
+
+    return result
+
+
 def get_readable_time(secs: int = 0, the_format: str = "%Y%m%d%H%M%S") -> str:
     # Get a readable time string
     result = ""
@@ -510,7 +527,7 @@ def t2t(text: str, normal: bool, printable: bool, simplified: bool = False) -> s
 
         if normal:
             for special in ["spc", "spe"]:
-                text = "".join(eval(f"glovar.{special}_dict").get(t, t) for t in text)
+                text = "".join(getattr(glovar, f"{special}_dict").get(t, t) for t in text)
 
             text = normalize("NFKC", text)
 
@@ -526,11 +543,9 @@ def t2t(text: str, normal: bool, printable: bool, simplified: bool = False) -> s
 
 
 def thread(target: Callable, args: tuple) -> bool:
-    # Call a function using thread
+    # Call a function using the thread pool
     try:
-        t = Thread(target=target, args=args)
-        t.daemon = True
-        t.start()
+        pool.submit(get_queue(target), target, tuple(args))
 
         return True
     except Exception as e:
@@ -17,56 +17,102 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import lzma
+import zlib
+from io import BytesIO
 from os import remove
 from os.path import exists
-from pickle import dump
+from pickle import dump, dumps
 from shutil import copyfile
-from typing import Any
+from typing import Any, Iterable, Optional, Tuple
 
 from pyrogram import Client
-from pyAesCrypt import decryptFile, encryptFile
+from pyAesCrypt import decryptStream, encryptStream
 
 from .. import glovar
-from .etc import random_str, thread
+from .etc import random_str
 from .telegram import download_media
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
-def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
-    # Encrypt or decrypt a file
+def bytes_to_file(content: bytes) -> str:
+    # Save bytes to a file in tmp directory
     try:
-        if not file_in or not file_out:
-            return True
+        file_path = get_new_path()
+
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+        return file_path
+    except Exception as e:
+        logger.warning(f"Bytes to file error: {e}", exc_info=True)
+
+    return ""
+
+
+def compress_data(method: str, content: bytes) -> bytes:
+    # Compress bytes with the method, keep them as they are if no method, empty if failed
+    result = content
+    try:
+        if method == "lzma":
+            result = lzma.compress(content)
+        elif method == "zlib":
+            result = zlib.compress(content, 9)
+    except Exception as e:
+        logger.warning(f"Compress data error: {e}", exc_info=True)
+        result = b""
+
+    return result
+
+
+def crypt_data(operation: str, content: bytes) -> bytes:
+    # Encrypt or decrypt bytes in memory, the same format as the encrypted files
+    result = b""
+    try:
+        if not content:
+            return b""
 
         buffer = 64 * 1024
+        file_in = BytesIO(content)
+        file_out = BytesIO()
 
         if operation == "decrypt":
-            decryptFile(file_in, file_out, glovar.password, buffer)
+            decryptStream(file_in, file_out, glovar.password, buffer, len(content))
         else:
-            encryptFile(file_in, file_out, glovar.password, buffer)
+            encryptStream(file_in, file_out, glovar.password, buffer)
 
-        return True
+        result = file_out.getvalue()
     except Exception as e:
-        logger.warning(f"Crypt file error: {e}", exc_info=True)
+        logger.warning(f"Crypt data error: {e}", exc_info=True)
 
-    return False
+    return result
 
 
-def data_to_file(data: Any) -> str:
-    # Save data to a file in tmp directory
+def data_to_bytes(data: Any) -> bytes:
+    # Serialize data
+    result = b""
     try:
-        file_path = get_new_path()
+        result = dumps(data)
+    except Exception as e:
+        logger.warning(f"Data to bytes error: {e}", exc_info=True)
 
-        with open(file_path, "wb") as f:
-            dump(data, f)
+    return result
 
-        return file_path
+
+def decompress_data(method: str, content: bytes) -> bytes:
+    # Decompress bytes with the method, keep them as they are if no method
+    result = content
+    try:
+        if method == "lzma":
+            result = lzma.decompress(content)
+        elif method == "zlib":
+            result = zlib.decompress(content)
     except Exception as e:
-        logger.warning(f"Data to file error: {e}", exc_info=True)
+        logger.warning(f"Decompress data error: {e}", exc_info=True)
 
-    return ""
+    return result
 
 
 def delete_file(path: str) -> bool:
@@ -113,10 +159,35 @@ def get_new_path(extension: str = "") -> str:
     return result
 
 
+def journal(file: str, records: Iterable[Tuple[str, str, Optional[dict]]]) -> bool:
+    # Append the records of the changed rules to the file's journal
+    glovar.locks["journal"].acquire()
+    try:
+        if not glovar:
+            return True
+
+        with open(f"data/{file}.log", "ab") as f:
+            for record in records:
+                dump(record, f)
+                glovar.journals[file] = glovar.journals.get(file, 0) + 1
+
+        # Compact the journal into the data file
+        if glovar.journals[file] >= glovar.journal_limit:
+            save(file)
+
+        return True
+    except Exception as e:
+        logger.error(f"Journal error: {e}", exc_info=True)
+    finally:
+        glovar.locks["journal"].release()
+
+    return False
+
+
 def save(file: str) -> bool:
-    # Save a global variable to a file
+    # Mark a global variable to be saved to a file by save_files
     try:
-        thread(save_thread, (file,))
+        glovar.dirty_files.add(file)
 
         return True
     except Exception as e:
@@ -125,19 +196,46 @@ def save(file: str) -> bool:
     return False
 
 
+def save_files() -> bool:
+    # Save the marked files, each one at most once per call
+    try:
+        for file in list(glovar.dirty_files):
+            # Marked again while saving, will be saved next time
+            glovar.dirty_files.discard(file)
+            save_thread(file)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Save files error: {e}", exc_info=True)
+
+    return False
+
+
 def save_thread(file: str) -> bool:
-    # Save thread
+    # Save thread, pickle the data under the regex read lock, mark the file again if failed
+    glovar.locks["regex"].acquire_read()
+    glovar.locks["journal"].acquire()
     try:
-        if not glovar:
-            return True
+        # The writers wait for the journal lock after changing the rules, so their records stay in the journal
+        try:
+            content = dumps(getattr(glovar, file))
+        finally:
+            glovar.locks["regex"].release_read()
 
         with open(f"data/.{file}", "wb") as f:
-            dump(eval(f"glovar.{file}"), f)
+            f.write(content)
 
         copyfile(f"data/.{file}", f"data/{file}")
 
+        # The journal's records are all in the data file now
+        delete_file(f"data/{file}.log")
+        glovar.journals[file] = 0
+
         return True
     except Exception as e:
         logger.error(f"Save thread error: {e}", exc_info=True)
+        save(file)
+    finally:
+        glovar.locks["journal"].release()
 
     return False
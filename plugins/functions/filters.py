@@ -18,19 +18,22 @@
 
 import logging
 import re
-from typing import Match, Optional, Union
+from functools import lru_cache
+from hashlib import sha256
+from typing import Dict, Iterable, List, Match, Optional, Pattern, Set, Tuple, Union
 
 from pyrogram import CallbackQuery, Filters, Message
 from xeger import Xeger
 
 from .. import glovar
+from .dfa import get_form, is_contained
+from .etc import thread
+from .literal import build_automaton, fold_text, get_alphabet, get_grams, get_literals, search_automaton
+from .store import rules
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
-# Xeger config
-xg = Xeger(limit=32)
-
 
 def is_aio(_, __) -> bool:
     # Check if the program is under all-in-one mode
@@ -162,6 +165,235 @@ regex_group = Filters.create(
 )
 
 
+def get_candidates(matcher: Dict[str, list], text: str, first: bool = True) -> List[int]:
+    # Get the indices of the rules that may hit the text, in the rules' order
+    result = []
+    try:
+        candidates: Set[int] = set(matcher["singles"])
+
+        # Rules whose literals appear in the text
+        if matcher["keys"]:
+            for literal in search_automaton(matcher["automaton"], fold_text(text)):
+                candidates.update(matcher["keys"][literal])
+
+        for combined, indices in matcher["chunks"]:
+            match = combined.search(text)
+
+            if not match:
+                continue
+
+            if not first:
+                candidates.update(indices)
+                continue
+
+            # Rules after the hit one in the same chunk can not be the first hit
+            hit = indices[int(match.lastgroup[1:])]
+            candidates.update(i for i in indices if i <= hit)
+
+        result = sorted(candidates)
+    except Exception as e:
+        logger.warning(f"Get candidates error: {e}", exc_info=True)
+
+    return result
+
+
+def get_equivalent(word_type: str, word: str) -> List[str]:
+    # Get the rules of the word type equivalent to the word, none until the forms index is built
+    result = []
+    try:
+        try:
+            re.compile(word, re.I | re.M | re.S)
+        except re.error:
+            return []
+
+        # Never scan the rules instead, the callers hold the regex lock, they still check the same rule
+        forms = get_forms(word_type)
+
+        if forms is None:
+            return []
+
+        form = get_form(word)
+        result = sorted(forms.get(form, set())) if form else []
+    except Exception as e:
+        logger.warning(f"Get equivalent error: {e}", exc_info=True)
+
+    return result
+
+
+def get_forms(word_type: str) -> Optional[Dict[str, Set[str]]]:
+    # Get the forms index of the word type, None until update_forms has built it in the background
+    result = glovar.forms.get(word_type)
+
+    if result is not None or word_type in glovar.forms:
+        return result
+
+    start = False
+
+    glovar.locks["load"].acquire()
+    try:
+        if word_type not in glovar.forms:
+            glovar.forms[word_type] = None
+            start = True
+
+        result = glovar.forms[word_type]
+    except Exception as e:
+        logger.warning(f"Get forms error: {e}", exc_info=True)
+    finally:
+        glovar.locks["load"].release()
+
+    # Submitted without the lock, the submit may wait for a full queue whose workers need the lock
+    start and thread(update_forms, (word_type,))
+
+    return result
+
+
+def get_index(word_type: str) -> Dict[str, Set[str]]:
+    # Get the trigram index of the word type's rules, built on first use and kept by update_patterns
+    result = glovar.grams.get(word_type)
+
+    if result is not None:
+        return result
+
+    glovar.locks["load"].acquire()
+    try:
+        if glovar.grams.get(word_type) is None:
+            index = {}
+
+            for word in list(rules[word_type]):
+                for gram in get_grams(word):
+                    index.setdefault(gram, set()).add(word)
+
+            glovar.grams[word_type] = index
+
+        result = glovar.grams[word_type]
+    except Exception as e:
+        logger.warning(f"Get index error: {e}", exc_info=True)
+    finally:
+        glovar.locks["load"].release()
+
+    return result or {}
+
+
+def get_matcher(word_type: str, ocr: bool = False, size: int = 100) -> Dict[str, list]:
+    # Get the matcher of the word type, build it if the rules changed
+    result = {}
+    try:
+        # Store the result in the dict got before reading the patterns, never in a newer one
+        matchers = glovar.matchers.setdefault(word_type, {})
+        result = matchers.get(ocr)
+
+        if result is not None:
+            return result
+
+        patterns = [(w, p) for w, p in list(get_patterns(word_type).items()) if not (ocr and "(?# nocr)" in w)]
+        result = {
+            "words": [w for w, _ in patterns],
+            "patterns": [p for _, p in patterns],
+            "automaton": None,
+            "keys": {},
+            "chunks": [],
+            "singles": []
+        }
+
+        # Group the combinable rules into chunks, keep the order of the rules
+        chunk = []
+        literals = glovar.literals.setdefault(word_type, {})
+
+        for i, (word, pattern) in enumerate(patterns):
+            if word not in literals:
+                literals[word] = get_literals(word)
+
+            if literals[word]:
+                for literal in literals[word]:
+                    result["keys"].setdefault(literal, []).append(i)
+            elif glovar.combine and is_combinable(pattern):
+                chunk.append(i)
+            else:
+                result["singles"].append(i)
+
+            if chunk and (len(chunk) >= size or i == len(patterns) - 1):
+                try:
+                    combined = "|".join(f"(?P<r{j}>{patterns[index][0]})" for j, index in enumerate(chunk))
+                    result["chunks"].append((re.compile(combined, re.I | re.M | re.S), chunk))
+                except Exception as e:
+                    logger.info(f"Combine {word_type} rules error: {e}")
+                    result["singles"] += chunk
+
+                chunk = []
+
+        result["automaton"] = build_automaton(result["keys"])
+        matchers[ocr] = result
+    except Exception as e:
+        logger.warning(f"Get matcher error: {e}", exc_info=True)
+
+    return result
+
+
+def get_patterns(word_type: str) -> Dict[str, Pattern]:
+    # Get the compiled patterns of the word type
+    result = glovar.compiled.get(word_type)
+
+    if result is not None:
+        return result
+
+    glovar.locks["load"].acquire()
+    try:
+        if glovar.compiled.get(word_type) is None:
+            patterns = {}
+
+            for word in list(rules[word_type]):
+                try:
+                    patterns[word] = re.compile(word, re.I | re.M | re.S)
+                except Exception as e:
+                    logger.warning(f"Compile {word_type} rule {word} error: {e}")
+
+            glovar.compiled[word_type] = patterns
+
+        result = glovar.compiled[word_type]
+    except Exception as e:
+        logger.warning(f"Get patterns error: {e}", exc_info=True)
+    finally:
+        glovar.locks["load"].release()
+
+    return result or {}
+
+
+def is_combinable(pattern: Pattern) -> bool:
+    # Check if the pattern can be merged into a combined alternation
+    try:
+        # Global inline flags
+        if re.compile(pattern.pattern).flags != re.compile("").flags:
+            return False
+
+        # Named groups may conflict with other rules
+        if pattern.groupindex:
+            return False
+
+        # Group references would point to other groups after being wrapped
+        if pattern.groups and re.search(r"\\[1-9]|\(\?P=|\(\?\(", pattern.pattern):
+            return False
+
+        return True
+    except Exception as e:
+        logger.warning(f"Is combinable error: {e}", exc_info=True)
+
+    return False
+
+
+def is_finding(a: str, b: str, pattern: Optional[Pattern], samples: List[str]) -> bool:
+    # Check if rule a finds every text that rule b finds, by the automata or by the samples of b
+    result = False
+    try:
+        result = is_contained(a, b)
+
+        if result is None:
+            result = bool(pattern and samples and all(pattern.search(sample) for sample in samples))
+    except Exception as e:
+        logger.warning(f"Is finding error: {e}", exc_info=True)
+
+    return result
+
+
 def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
@@ -176,13 +408,10 @@ def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = Fa
         else:
             return None
 
-        words = list(eval(f"glovar.{word_type}_words"))
+        matcher = get_matcher(word_type, ocr)
 
-        for word in words:
-            if ocr and "(?# nocr)" in word:
-                continue
-
-            result = re.search(word, text, re.I | re.S | re.M)
+        for i in get_candidates(matcher, text):
+            result = matcher["patterns"][i].search(text)
 
             # Return
             if result:
@@ -196,8 +425,191 @@ def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = Fa
     return result
 
 
-def is_similar(mode: str, a: str, b: str) -> bool:
-    # Get regex match result
+def is_regex_text_all(word_type: str, text: str, ocr: bool = False) -> List[str]:
+    # Get all the rules hit by the text, try again without spaces for the rules not hit
+    result = []
+    try:
+        if not text:
+            return []
+
+        # Use the matcher's own rules list, it won't change after being built
+        matcher = get_matcher(word_type, ocr)
+        hits = set()
+
+        text = re.sub(r"\s{2,}", " ", text)
+        texts = [text]
+
+        if re.search(r"\s", text):
+            texts.append(re.sub(r"\s", "", text))
+
+        for text in texts:
+            for i in get_candidates(matcher, text, False):
+                if i not in hits and matcher["patterns"][i].search(text):
+                    hits.add(i)
+
+        result = [matcher["words"][i] for i in sorted(hits)]
+    except Exception as e:
+        logger.warning(f"Is regex text all error: {e}", exc_info=True)
+
+    return result
+
+
+def find_words(word_type: str, word: str) -> Optional[List[str]]:
+    # Get the rules of the word type containing the word, None if the word is too short for the index
+    result = None
+    try:
+        grams = get_grams(word)
+
+        if not grams:
+            return None
+
+        index = get_index(word_type)
+
+        # The sets may be changed by update_patterns, intersect them under its lock
+        glovar.locks["load"].acquire()
+        try:
+            postings = sorted((index.get(gram, set()) for gram in grams), key=len)
+            candidates = set(postings[0])
+
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+
+                candidates &= posting
+        finally:
+            glovar.locks["load"].release()
+
+        result = [w for w in candidates if word in w]
+    except Exception as e:
+        logger.warning(f"Find words error: {e}", exc_info=True)
+
+    return result
+
+
+def get_redundant(word_type: str, others: Iterable[str], words: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    # Get the words found by a rule of the types, the word type's own words by another of its rules
+    result = {}
+    try:
+        for other in others:
+            matcher = get_matcher(other)
+            automaton = matcher["automaton"]
+            keys = matcher["keys"]
+            unindexed = set(matcher["singles"]).union(*(indexes for _, indexes in matcher["chunks"]))
+
+            for word in words:
+                if word in result:
+                    continue
+
+                samples = get_samples(word, word_type)
+
+                if not samples:
+                    continue
+
+                # A rule must find every sample, so it has one of its literals in every sample
+                candidates = None
+
+                for sample in samples:
+                    found = {i for literal in search_automaton(automaton, fold_text(sample)) for i in keys[literal]}
+                    candidates = found if candidates is None else candidates & found
+
+                for i in sorted(candidates | unindexed):
+                    keeper = matcher["words"][i]
+
+                    if (other == word_type and keeper == word
+                            or not is_finding(keeper, word, matcher["patterns"][i], samples)):
+                        continue
+
+                    # Keep the shorter one of the equivalent rules of the same type
+                    if (other == word_type and (len(keeper), keeper) > (len(word), word)
+                            and is_finding(word, keeper, get_patterns(word_type).get(word),
+                                           get_samples(keeper, other))):
+                        continue
+
+                    result[word] = (other, keeper)
+                    break
+    except Exception as e:
+        logger.warning(f"Get redundant error: {e}", exc_info=True)
+
+    return result
+
+
+def get_samples(word: str, word_type: str = "") -> List[str]:
+    # Get the samples of the word, from the bank if the word is a rule of the word type
+    if not word_type:
+        return list(sample_word(word))
+
+    bank = glovar.samples.setdefault(word_type, {})
+    result = bank.get(word)
+
+    if result is None:
+        result = bank[word] = list(sample_word(word))
+
+    return result
+
+
+def get_similar(word_type: str, word: str) -> List[str]:
+    # Get the rules similar to the new word, same as is_similar in strict mode
+    result = []
+    try:
+        pattern = re.compile(word, re.I | re.M | re.S)
+        word_literals = get_literals(word)
+
+        # The samples of the new word, shared by all the rules
+        automaton = get_matcher(word_type)["automaton"]
+        samples = get_samples(word)
+        hits = [search_automaton(automaton, fold_text(sample)) for sample in samples]
+
+        literals = glovar.literals.setdefault(word_type, {})
+        alphabets = glovar.alphabets.setdefault(word_type, {})
+
+        for old in list(rules[word_type]):
+            if old not in literals:
+                literals[old] = get_literals(old)
+
+            if old not in alphabets:
+                alphabets[old] = get_alphabet(old)
+
+            # A sample of the new word must contain one of the rule's literals to match it
+            old_literals = literals[old]
+
+            # A sample of the rule must contain one of the new word's literals to be matched
+            reachable = (not word_literals or alphabets[old] is None
+                         or any(set(literal) <= alphabets[old] for literal in word_literals))
+
+            try:
+                # Decide by the automata, the checks above also rule out the containments
+                contains = all(old_literals is None or old_literals & h for h in hits) and is_contained(old, word)
+                contained = reachable and is_contained(word, old)
+
+                if contains or contained:
+                    result.append(old)
+                    continue
+
+                if contains is not None and contained is not None:
+                    continue
+
+                # Fall back to the samples
+                for i in range(3):
+                    if old_literals is None or old_literals & hits[i]:
+                        if re.search(old, samples[i], re.I | re.M | re.S):
+                            continue
+
+                    if reachable and pattern.search(get_samples(old, word_type)[i]):
+                        continue
+
+                    break
+                else:
+                    result.append(old)
+            except Exception as e:
+                logger.warning(f"Get similar {old} error: {e}", exc_info=True)
+    except Exception as e:
+        logger.warning(f"Get similar error: {e}", exc_info=True)
+
+    return result
+
+
+def is_similar(mode: str, a: str, b: str, word_type: str = "") -> bool:
+    # Get regex match result, a is a rule of the word type if the type is given
     try:
         if mode == "find":
             if b not in a:
@@ -206,21 +618,32 @@ def is_similar(mode: str, a: str, b: str) -> bool:
         elif mode == "loose" or mode == "s":
             if not (re.search(a, b, re.I | re.M | re.S)
                     or re.search(b, a, re.I | re.M | re.S)
-                    or re.search(a, xg.xeger(b), re.I | re.M | re.S)
-                    or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
+                    or re.search(a, get_samples(b)[0], re.I | re.M | re.S)
+                    or re.search(b, get_samples(a, word_type)[0], re.I | re.M | re.S)):
                 return False
 
         elif mode == "search":
             if not (re.search(b, a, re.I | re.M | re.S)
-                    or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
+                    or re.search(b, get_samples(a, word_type)[0], re.I | re.M | re.S)):
                 return False
 
         elif mode == "strict":
+            contains = is_contained(a, b)
+            contained = is_contained(b, a)
+
+            if contains or contained:
+                return True
+
+            if contains is not None and contained is not None:
+                return False
+
+            a_samples = get_samples(a, word_type)
+            b_samples = get_samples(b)
             i = 0
 
             while i < 3:
-                if not (re.search(a, xg.xeger(b), re.I | re.M | re.S)
-                        or re.search(b, xg.xeger(a), re.I | re.M | re.S)):
+                if not (re.search(a, b_samples[i], re.I | re.M | re.S)
+                        or re.search(b, a_samples[i], re.I | re.M | re.S)):
                     return False
 
                 i += 1
@@ -239,3 +662,113 @@ def is_similar(mode: str, a: str, b: str) -> bool:
         logger.warning(f"Is similar error: {e}", exc_info=True)
 
     return False
+
+
+@lru_cache(maxsize=256)
+def sample_word(word: str) -> Tuple[str, ...]:
+    # Generate the samples of the word from a generator seeded by the word, so they are always the same
+    result = ()
+    try:
+        seed = int.from_bytes(sha256(word.encode("utf-8")).digest()[:8], "big") or 1
+        xg = Xeger(limit=32, seed=seed)
+        result = tuple(xg.xeger(word) for _ in range(glovar.sample_size))
+    except Exception as e:
+        logger.info(f"Sample word {word} error: {e}")
+
+    return result
+
+
+def update_forms(word_type: str) -> bool:
+    # Build the forms index of the word type, hash the rules before taking the lock
+    try:
+        forms = {word: get_form(word) for word in list(rules[word_type])}
+
+        glovar.locks["load"].acquire()
+        try:
+            # The rules changed meanwhile are hashed again, update_patterns keeps the index after this
+            index = {}
+
+            for word in list(rules[word_type]):
+                form = forms[word] if word in forms else get_form(word)
+                form and index.setdefault(form, set()).add(word)
+
+            glovar.forms[word_type] = index
+        finally:
+            glovar.locks["load"].release()
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update forms error: {e}", exc_info=True)
+        glovar.forms.pop(word_type, None)
+
+    return False
+
+
+def update_patterns(word_type: str, added: Iterable[str] = (), removed: Iterable[str] = ()) -> bool:
+    # Update the compiled patterns of the word type
+    glovar.locks["load"].acquire()
+    try:
+        patterns = glovar.compiled.get(word_type)
+        literals = glovar.literals.setdefault(word_type, {})
+        alphabets = glovar.alphabets.setdefault(word_type, {})
+        samples = glovar.samples.setdefault(word_type, {})
+        grams = glovar.grams.get(word_type)
+        forms = glovar.forms.get(word_type)
+
+        for word in removed:
+            literals.pop(word, None)
+            alphabets.pop(word, None)
+            samples.pop(word, None)
+
+        for word in added:
+            samples[word] = list(sample_word(word))
+
+        # Not indexed yet, get_index will index the current words
+        if grams is not None:
+            for word in removed:
+                for gram in get_grams(word):
+                    posting = grams.get(gram, set())
+                    posting.discard(word)
+
+                    if not posting:
+                        grams.pop(gram, None)
+
+            for word in added:
+                for gram in get_grams(word):
+                    grams.setdefault(gram, set()).add(word)
+
+        # Not hashed yet, update_forms will hash the current words
+        if forms is not None:
+            for word in removed:
+                form = get_form(word)
+                equivalents = forms.get(form, set())
+                equivalents.discard(word)
+
+                if not equivalents:
+                    forms.pop(form, None)
+
+            for word in added:
+                form = get_form(word)
+                form and forms.setdefault(form, set()).add(word)
+
+        # Not compiled yet, get_patterns will compile the current words
+        if patterns is not None:
+            for word in removed:
+                patterns.pop(word, None)
+
+            for word in added:
+                try:
+                    patterns[word] = re.compile(word, re.I | re.M | re.S)
+                except Exception as e:
+                    logger.warning(f"Compile {word_type} rule {word} error: {e}")
+
+        # Drop the matchers only after the patterns are updated, a matcher built meanwhile goes to the old dict
+        glovar.matchers[word_type] = {}
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update patterns error: {e}", exc_info=True)
+    finally:
+        glovar.locks["load"].release()
+
+    return False
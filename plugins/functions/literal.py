@@ -0,0 +1,250 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from string import ascii_letters, printable
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Characters matched by an ASCII letter under re.I, but not lowered to it by str.lower()
+fold_table: Dict[int, str] = {
+    0x130: "i",
+    0x131: "i",
+    0x17f: "s"
+}
+
+# Aho-Corasick automaton: goto, fail and output of every state
+Automaton = Tuple[List[Dict[str, int]], List[int], List[List[str]]]
+
+
+def build_automaton(literals: Iterable[str]) -> Automaton:
+    # Build an Aho-Corasick automaton of the literals
+    goto: List[Dict[str, int]] = [{}]
+    fail: List[int] = [0]
+    out: List[List[str]] = [[]]
+
+    try:
+        # Trie
+        for literal in literals:
+            state = 0
+
+            for c in literal:
+                if c not in goto[state]:
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                    goto[state][c] = len(goto) - 1
+
+                state = goto[state][c]
+
+            if literal not in out[state]:
+                out[state].append(literal)
+
+        # Failure links, breadth first
+        queue = list(goto[0].values())
+
+        for state in queue:
+            for c, child in goto[state].items():
+                queue.append(child)
+
+                if state:
+                    f = fail[state]
+
+                    while f and c not in goto[f]:
+                        f = fail[f]
+
+                    fail[child] = goto[f].get(c, 0)
+
+                out[child] = out[child] + out[fail[child]]
+    except Exception as e:
+        logger.warning(f"Build automaton error: {e}", exc_info=True)
+
+    return goto, fail, out
+
+
+def get_alphabet(word: str, size: int = 4096) -> Optional[Set[str]]:
+    # Get the folded characters of the strings xeger may generate for the rule, None if too many
+    result = None
+    try:
+        result = get_alphabet_items(sre_parse.parse(word))
+
+        if result is not None and len(result) > size:
+            result = None
+    except Exception as e:
+        logger.info(f"Get alphabet of {word} error: {e}")
+
+    return result
+
+
+def get_alphabet_items(items: Iterable[Tuple]) -> Optional[Set[str]]:
+    # Get the alphabet of a parsed sequence, the way xeger builds its strings
+    result = set()
+
+    for op, av in items:
+        name = op.name
+
+        if name == "LITERAL":
+            result.add(chr(av))
+        elif name == "RANGE":
+            result.update(chr(c) for c in range(av[0], av[1] + 1))
+        elif name in {"ANY", "CATEGORY", "NEGATE", "NOT_LITERAL"}:
+            result.update(printable)
+        elif name == "IN":
+            alphabet = get_alphabet_items(av)
+
+            if alphabet is None:
+                return None
+
+            result |= alphabet
+        elif name == "BRANCH":
+            for branch in av[1]:
+                alphabet = get_alphabet_items(branch)
+
+                if alphabet is None:
+                    return None
+
+                result |= alphabet
+        elif name in {"SUBPATTERN", "ASSERT", "MAX_REPEAT", "MIN_REPEAT"}:
+            alphabet = get_alphabet_items(av[-1])
+
+            if alphabet is None:
+                return None
+
+            result |= alphabet
+        elif name not in {"AT", "ASSERT_NOT", "GROUPREF"}:
+            return None
+
+    return {f for c in result for f in fold_text(c)}
+
+
+def fold_text(text: str) -> str:
+    # Fold the text, so a literal found in it under re.I is also found as a plain substring
+    result = text
+    try:
+        result = text.translate(fold_table).lower()
+    except Exception as e:
+        logger.warning(f"Fold text error: {e}", exc_info=True)
+
+    return result
+
+
+def get_grams(text: str, size: int = 3) -> Set[str]:
+    # Get the substrings of the text with the size, the keys of the find index
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def get_literals(word: str) -> Optional[Set[str]]:
+    # Get a set of folded literals, every match of the rule contains at least one of them
+    result = None
+    try:
+        result = get_literals_items(sre_parse.parse(word, re.I | re.M | re.S))
+    except Exception as e:
+        logger.info(f"Get literals of {word} error: {e}")
+
+    return result
+
+
+def get_literals_items(items: Iterable[Tuple]) -> Optional[Set[str]]:
+    # Get the best literals set of a parsed sequence
+    result = None
+    try:
+        candidates: List[Set[str]] = []
+        run = ""
+
+        for op, av in items:
+            # Extend the current run of literals
+            if op is sre_parse.LITERAL and is_foldable(chr(av)):
+                run += fold_text(chr(av))
+                continue
+
+            if run:
+                candidates.append({run})
+                run = ""
+
+            # Mandatory group
+            if op is sre_parse.SUBPATTERN:
+                literals = get_literals_items(av[-1])
+            elif op.name == "ATOMIC_GROUP":
+                literals = get_literals_items(av)
+
+            # Repeated at least once
+            elif op.name in {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"} and av[0] >= 1:
+                literals = get_literals_items(av[2])
+
+            # Every branch must have its own literals
+            elif op is sre_parse.BRANCH:
+                branches = [get_literals_items(branch) for branch in av[1]]
+                literals = set().union(*branches) if branches and all(branches) else None
+
+            else:
+                literals = None
+
+            literals and candidates.append(literals)
+
+        if run:
+            candidates.append({run})
+
+        if candidates:
+            result = max(candidates, key=lambda x: (min(len(literal) for literal in x), -len(x)))
+    except Exception as e:
+        logger.warning(f"Get literals items error: {e}", exc_info=True)
+
+    return result
+
+
+def is_foldable(c: str) -> bool:
+    # Check if the character's case insensitive matches are all covered by fold_text
+    try:
+        if c.lower() == c == c.upper():
+            return True
+
+        if c in ascii_letters:
+            return True
+    except Exception as e:
+        logger.warning(f"Is foldable error: {e}", exc_info=True)
+
+    return False
+
+
+def search_automaton(automaton: Automaton, text: str) -> Set[str]:
+    # Get the literals which appear in the folded text
+    result = set()
+    try:
+        goto, fail, out = automaton
+        state = 0
+
+        for c in text:
+            while state and c not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(c, 0)
+
+            if out[state]:
+                result.update(out[state])
+    except Exception as e:
+        logger.warning(f"Search automaton error: {e}", exc_info=True)
+
+    return result
@@ -0,0 +1,79 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Condition, Lock
+
+
+class RWLock:
+    # Shared by the readers, exclusive for a writer, waiting writers go before new readers
+    def __init__(self) -> None:
+        self.condition = Condition(Lock())
+        self.readers = 0
+        self.waiting = 0
+        self.writer = False
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    def acquire(self) -> bool:
+        # Acquire the lock for writing, same as a Lock
+        with self.condition:
+            self.waiting += 1
+
+            try:
+                while self.writer or self.readers:
+                    self.condition.wait()
+            finally:
+                self.waiting -= 1
+
+            self.writer = True
+
+        return True
+
+    def acquire_read(self) -> bool:
+        # Acquire the lock for reading
+        with self.condition:
+            while self.writer or self.waiting:
+                self.condition.wait()
+
+            self.readers += 1
+
+        return True
+
+    def release(self) -> None:
+        # Release the lock held for writing
+        with self.condition:
+            if not self.writer:
+                raise RuntimeError("Release unlocked lock")
+
+            self.writer = False
+            self.condition.notify_all()
+
+    def release_read(self) -> None:
+        # Release the lock held for reading
+        with self.condition:
+            if not self.readers:
+                raise RuntimeError("Release unlocked lock")
+
+            self.readers -= 1
+
+            if not self.readers:
+                self.condition.notify_all()
@@ -0,0 +1,216 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import deque
+from random import uniform
+from threading import Event, Lock
+from time import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pyrogram.errors import FloodWait
+
+from .. import glovar
+from .pool import pool
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class Request:
+    # A call waiting in a chat's queue
+    __slots__ = ("method", "kwargs", "merge", "wait", "event", "result", "error")
+
+    def __init__(self, method: Callable, kwargs: Dict[str, Any], merge: bool, wait: bool) -> None:
+        self.method = method
+        self.kwargs = kwargs
+        self.merge = merge
+        self.wait = wait
+        self.event = Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class Outbox:
+    # Per chat queues of the Telegram calls, rate limited by token buckets
+    def __init__(self, limits: Dict[str, Tuple[float, int]], name: str, detached: str) -> None:
+        self.buckets: Dict[int, Dict[str, float]] = {}
+        self.detached = detached
+        self.limits = limits
+        self.lock = Lock()
+        self.name = name
+        self.queues: Dict[int, Deque[Request]] = {}
+        self.running: Set[int] = set()
+
+    def bucket(self, key: int, now: float) -> Dict[str, float]:
+        # Get the refilled bucket of the key, 0 is the bucket shared by all chats
+        rate, size = self.limits[self.kind(key)]
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            bucket = self.buckets[key] = {"tokens": size, "time": now, "until": 0.0}
+
+        bucket["tokens"] = min(size, bucket["tokens"] + (now - bucket["time"]) * rate)
+        bucket["time"] = now
+
+        return bucket
+
+    def dispatch(self, cid: int) -> bool:
+        # Run the chat's queued calls in order, reschedule instead of sleeping
+        while True:
+            with self.lock:
+                queue = self.queues.get(cid)
+
+                if not queue:
+                    self.queues.pop(cid, None)
+                    self.running.discard(cid)
+                    return True
+
+                secs = self.take(cid)
+
+                if secs > 0:
+                    pool.delay(secs, self.name, self.dispatch, (cid,))
+                    return True
+
+                requests = self.pop(queue)
+
+            self.run(cid, requests)
+
+    def flood(self, cid: int, e: FloodWait) -> bool:
+        # Pause the chat, a FloodWait of a call without a chat pauses all chats
+        with self.lock:
+            now = time()
+            bucket = self.bucket(cid, now)
+            bucket["until"] = max(bucket["until"], now + e.x + uniform(0.5, 1.0))
+
+        logger.warning(f"Flood wait {e.x} secs in {cid or 'all chats'}")
+
+        return True
+
+    def kind(self, key: int) -> str:
+        # Get the limits' name of the key
+        if not key:
+            return "all"
+        elif key < 0:
+            return "group"
+        else:
+            return "private"
+
+    def pop(self, queue: Deque[Request]) -> List[Request]:
+        # Pop the next request, together with the following mergeable messages
+        result = [queue.popleft()]
+
+        if not result[0].merge:
+            return result
+
+        length = len(result[0].kwargs["text"])
+
+        while queue and queue[0].merge and length + len(queue[0].kwargs["text"]) + 1 <= 4096:
+            length += len(queue[0].kwargs["text"]) + 1
+            result.append(queue.popleft())
+
+        if len(result) > 1:
+            request = Request(result[0].method, dict(result[0].kwargs), True, False)
+            request.kwargs["text"] = "\n".join(r.kwargs["text"] for r in result)
+            result.insert(0, request)
+
+        return result
+
+    def request(self, cid: int, method: Callable, kwargs: Dict[str, Any],
+                wait: Optional[bool] = None, merge: bool = False) -> Any:
+        # Queue the call, wait for its result and raise its error unless FloodWait,
+        # by default the workers of the detached queue do not wait, their tasks never use the result
+        if wait is None:
+            wait = not pool.working(self.detached)
+
+        request = Request(method, kwargs, merge, wait)
+
+        with self.lock:
+            self.queues.setdefault(cid, deque()).append(request)
+            start = cid not in self.running
+            self.running.add(cid)
+
+        start and pool.submit(self.name, self.dispatch, (cid,))
+
+        if not wait:
+            return None
+
+        request.event.wait()
+
+        if request.error is not None:
+            raise request.error
+
+        return request.result
+
+    def run(self, cid: int, requests: List[Request]) -> bool:
+        # Run the first request, give its result to the merged ones
+        request = requests[0]
+
+        try:
+            request.result = request.method(**request.kwargs)
+        except FloodWait as e:
+            self.flood(cid, e)
+
+            # Put the original requests back in front of the queue
+            with self.lock:
+                self.queues.setdefault(cid, deque()).extendleft(reversed(requests[1:] or requests))
+
+            return False
+        except Exception as e:
+            request.error = e
+
+            if not any(r.wait for r in requests):
+                logger.warning(f"Outbox call {request.method.__name__} in {cid} error: {e}")
+
+        for r in requests:
+            r.result = request.result
+            r.error = request.error
+            r.event.set()
+
+        return True
+
+    def status(self) -> Dict[str, int]:
+        # Get the number of queued calls and paused chats
+        with self.lock:
+            now = time()
+
+            return {
+                "queued": sum(len(queue) for queue in self.queues.values()),
+                "paused": sum(1 for bucket in self.buckets.values() if bucket["until"] > now)
+            }
+
+    def take(self, cid: int) -> float:
+        # Take a token of the chat and the shared bucket, or get the secs to wait for them
+        now = time()
+        keys = [0, cid] if cid else [0]
+        buckets = [self.bucket(key, now) for key in keys]
+        secs = max([b["until"] - now for b in buckets] + [(1 - b["tokens"]) / self.limits[self.kind(k)][0]
+                                                          for k, b in zip(keys, buckets)])
+
+        if secs > 0:
+            return secs
+
+        for b in buckets:
+            b["tokens"] -= 1
+
+        return 0.0
+
+
+# Edits and callback answers do not wait for the send tokens
+editbox = Outbox(glovar.edit_limits, "send", "telegram")
+outbox = Outbox(glovar.send_limits, "send", "telegram")
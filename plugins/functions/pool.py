@@ -0,0 +1,172 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from heapq import heappop, heappush
+from queue import Full, Queue
+from threading import Condition, Lock, Thread, current_thread
+from time import time
+from typing import Callable, Dict, List, Tuple, Union
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# A task: submitted time, target and args
+Task = Tuple[float, Callable, tuple]
+
+
+class Pool:
+    # Named queues, each one with a fixed number of worker threads
+    def __init__(self, sizes: Dict[str, int], maxsize: int) -> None:
+        self.condition = Condition()
+        self.lock = Lock()
+        self.maxsize = maxsize
+        self.queues: Dict[str, Queue] = {}
+        self.sizes = sizes
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.timers: List[Tuple[float, int, str, Callable, tuple]] = []
+        self.timers_count = 0
+
+    def delay(self, secs: float, name: str, target: Callable, args: tuple) -> bool:
+        # Submit the task to the queue after secs
+        self.start()
+
+        with self.condition:
+            self.timers_count += 1
+            heappush(self.timers, (time() + secs, self.timers_count, name, target, args))
+            self.condition.notify()
+
+        return True
+
+    def run(self, name: str, task: Task) -> bool:
+        # Run the task, record its latency
+        submitted, target, args = task
+        started = time()
+
+        try:
+            target(*args)
+        except Exception as e:
+            logger.warning(f"Pool {name} task {target.__name__} error: {e}", exc_info=True)
+
+        with self.lock:
+            stats = self.stats[name]
+            stats["done"] += 1
+            stats["wait"] += started - submitted
+            stats["wait_max"] = max(stats["wait_max"], started - submitted)
+            stats["busy"] += time() - started
+
+        return True
+
+    def start(self) -> bool:
+        # Start the worker threads on first use
+        if self.queues:
+            return True
+
+        with self.lock:
+            if self.queues:
+                return True
+
+            queues = {}
+
+            for name in self.sizes:
+                self.stats[name] = {"submitted": 0, "done": 0, "wait": 0.0, "wait_max": 0.0, "busy": 0.0}
+                queues[name] = Queue(self.maxsize)
+
+                for i in range(self.sizes[name]):
+                    Thread(target=self.work, args=(name, queues[name]), name=f"{name}-{i}", daemon=True).start()
+
+            self.queues = queues
+            Thread(target=self.wake, name="timer", daemon=True).start()
+
+        return True
+
+    def status(self) -> Dict[str, Dict[str, Union[float, int]]]:
+        # Get the depth and the latency of every queue
+        result = {}
+
+        with self.lock:
+            for name, queue in self.queues.items():
+                stats = self.stats[name]
+                result[name] = {
+                    "depth": queue.qsize(),
+                    "submitted": stats["submitted"],
+                    "done": stats["done"],
+                    "wait": stats["done"] and stats["wait"] / stats["done"],
+                    "wait_max": stats["wait_max"],
+                    "busy": stats["done"] and stats["busy"] / stats["done"]
+                }
+
+        return result
+
+    def submit(self, name: str, target: Callable, args: tuple) -> bool:
+        # Put the task in the queue, block the producer while the queue is full
+        self.start()
+        queue = self.queues[name]
+        task = (time(), target, args)
+
+        with self.lock:
+            self.stats[name]["submitted"] += 1
+
+        # A worker must not wait for its own queue, run the task directly instead
+        if self.working(name):
+            try:
+                queue.put_nowait(task)
+            except Full:
+                self.run(name, task)
+        else:
+            queue.put(task)
+
+        return True
+
+    def wake(self) -> None:
+        # Submit the delayed tasks when they are due
+        while True:
+            with self.condition:
+                while not self.timers or self.timers[0][0] > time():
+                    timeout = self.timers[0][0] - time() if self.timers else None
+                    self.condition.wait(timeout)
+
+                _, count, name, target, args = heappop(self.timers)
+
+            # Never block on a full queue, the other queues' timers must keep running
+            try:
+                self.queues[name].put_nowait((time(), target, args))
+            except Full:
+                with self.condition:
+                    heappush(self.timers, (time() + 0.1, count, name, target, args))
+
+                continue
+
+            with self.lock:
+                self.stats[name]["submitted"] += 1
+
+    def working(self, name: str) -> bool:
+        # Check if the current thread is a worker of the queue
+        return current_thread().name.startswith(f"{name}-")
+
+    def work(self, name: str, queue: Queue) -> None:
+        # Run the tasks of the queue
+        while True:
+            task = queue.get()
+            self.run(name, task)
+            queue.task_done()
+
+
+pool = Pool(glovar.queues, glovar.queue_size)
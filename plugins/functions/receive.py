@@ -24,10 +24,14 @@ from typing import Any
 from pyrogram import Client, Message
 
 from .. import glovar
-from .channel import share_data
+from .channel import share_data, share_regex_update
 from .etc import code, get_now, get_text, lang, mention_id, thread
-from .file import crypt_file, data_to_file, delete_file, get_downloaded_path, get_new_path, save
+from .file import crypt_data, data_to_bytes, decompress_data, delete_file, get_downloaded_path
+from .outbox import editbox, outbox
+from .pool import pool
+from .store import rules
 from .telegram import send_document
+from .words import get_snapshot
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -61,36 +65,91 @@ def receive_captcha_data(client: Client, message: Message, data: dict) -> bool:
 
 def receive_count(client: Client, message: Message, data: str) -> bool:
     # Receive count
-    glovar.locks["regex"].acquire()
     try:
         word_type = data.replace("_words", "")
-        data = receive_file_data(client, message)
 
-        if not data:
+        if word_type not in glovar.regex:
             return True
 
-        data_set = set(data)
-        word_set = set(eval(f"glovar.{word_type}_words"))
-        the_set = data_set & word_set
+        # Downloaded on the io queue, only the merge runs on the cpu queue
+        pool.submit("io", receive_count_thread, (client, message, word_type))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive count error: {e}", exc_info=True)
 
-        for word in the_set:
-            eval(f"glovar.{word_type}_words")[word]["today"] += data[word]
-            eval(f"glovar.{word_type}_words")[word]["total"] += data[word]
-            total = eval(f"glovar.{word_type}_words")[word]["total"]
-            time = get_now() - eval(f"glovar.{word_type}_words")[word]["time"]
-            eval(f"glovar.{word_type}_words")[word]["average"] = total / (time / 86400)
+    return False
 
-        save(f"{word_type}_words")
+
+def receive_count_merge() -> bool:
+    # Merge all the pending counts into the rules' statistics
+    glovar.locks["regex"].acquire()
+    try:
+        glovar.locks["count"].acquire()
+        try:
+            counts, glovar.counts = glovar.counts, {}
+        finally:
+            glovar.locks["count"].release()
+
+        now = get_now()
+        failed = {}
+
+        # A failed type must not lose the counts of the other types
+        for word_type in counts:
+            try:
+                rules.count(word_type, counts[word_type], now)
+            except Exception as e:
+                logger.warning(f"Receive count merge {word_type} error: {e}", exc_info=True)
+                failed[word_type] = counts[word_type]
+
+        # Put the failed counts back, they will be merged next time
+        if failed:
+            glovar.locks["count"].acquire()
+            try:
+                for word_type in failed:
+                    pending = glovar.counts.setdefault(word_type, {})
+
+                    for word in failed[word_type]:
+                        pending[word] = pending.get(word, 0) + failed[word_type][word]
+            finally:
+                glovar.locks["count"].release()
 
         return True
     except Exception as e:
-        logger.warning(f"Receive count error: {e}", exc_info=True)
+        logger.warning(f"Receive count merge error: {e}", exc_info=True)
     finally:
         glovar.locks["regex"].release()
 
     return False
 
 
+def receive_count_thread(client: Client, message: Message, word_type: str) -> bool:
+    # Download and decode the count file without locking, then merge it with the other pending ones
+    try:
+        data = receive_file_data(client, message)
+
+        if not data:
+            return True
+
+        glovar.locks["count"].acquire()
+        try:
+            pending = glovar.counts.setdefault(word_type, {})
+
+            for word in data:
+                pending[word] = pending.get(word, 0) + data[word]
+        finally:
+            glovar.locks["count"].release()
+
+        # Other threads may have merged it already, then this is a no-op
+        thread(receive_count_merge, ())
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive count thread error: {e}", exc_info=True)
+
+    return False
+
+
 def receive_file_data(client: Client, message: Message, decrypt: bool = True) -> Any:
     # Receive file's data from exchange channel
     data = None
@@ -105,30 +164,61 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
         if not path:
             return None
 
-        if decrypt:
-            # Decrypt the file, save to the tmp directory
-            path_decrypted = get_new_path()
-            crypt_file("decrypt", path, path_decrypted)
-            path_final = path_decrypted
-        else:
-            # Read the file directly
-            path_decrypted = ""
-            path_final = path
+        with open(path, "rb") as f:
+            content = f.read()
 
-        with open(path_final, "rb") as f:
-            data = pickle.load(f)
+        thread(delete_file, (path,))
 
-        for f in {path, path_decrypted}:
-            thread(delete_file, (f,))
+        # Decrypt in memory
+        if decrypt:
+            content = crypt_data("decrypt", content)
+
+        # The method is told in the message's text, no method for the older senders
+        content = decompress_data(receive_text_data(message).get("compress", ""), content)
+        data = pickle.loads(content)
     except Exception as e:
         logger.warning(f"Receive file error: {e}", exc_info=True)
 
     return data
 
 
+def receive_regex_ack(sender: str, data: dict) -> bool:
+    # Receive the hash of the rules a receiver has loaded
+    try:
+        word_type = data["type"].replace("_words", "")
+
+        if word_type not in glovar.regex or sender not in glovar.receivers[word_type]:
+            return True
+
+        glovar.updates[word_type]["acks"][sender] = data["hash"]
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex ack error: {e}", exc_info=True)
+
+    return False
+
+
+def receive_regex_request(client: Client, sender: str, data: str) -> bool:
+    # Receive full regex update request
+    try:
+        word_type = data.replace("_words", "")
+
+        if word_type not in glovar.regex or sender not in glovar.receivers[word_type]:
+            return True
+
+        share_regex_update(client, word_type, True, [sender])
+
+        return True
+    except Exception as e:
+        logger.warning(f"Receive regex request error: {e}", exc_info=True)
+
+    return False
+
+
 def receive_status_ask(client: Client, data: dict) -> bool:
     # Receive version info request
-    glovar.locks["regex"].acquire()
+    glovar.locks["regex"].acquire_read()
     try:
         # Basic data
         aid = data["admin_id"]
@@ -137,12 +227,29 @@ def receive_status_ask(client: Client, data: dict) -> bool:
         status = {}
 
         for word_type in glovar.regex:
-            if not eval(f"glovar.{word_type}_words"):
+            words = get_snapshot(word_type)
+
+            if not words:
                 continue
 
-            status[lang(word_type)] = f"{len(eval(f'glovar.{word_type}_words'))} {lang('rules')}"
+            digest = rules.digest(word_type)
+            acks = glovar.updates[word_type]["acks"]
+            synced = sum(acks.get(receiver) == digest for receiver in glovar.receivers[word_type])
+            status[lang(word_type)] = (f"{len(words)} {lang('rules')} "
+                                       f"{digest[:8]} {synced}/{len(glovar.receivers[word_type])}")
 
-        file = data_to_file(status)
+        # Thread pool's queues
+        for name, stats in pool.status().items():
+            status[name] = (f"{stats['depth']} / {stats['done']} / "
+                            f"{round(stats['wait'] * 1000)} ms / {round(stats['wait_max'] * 1000)} ms")
+
+        # Send queues
+        stats = outbox.status()
+        status["outbox"] = f"{stats['queued']} / {stats['paused']}"
+        stats = editbox.status()
+        status["editbox"] = f"{stats['queued']} / {stats['paused']}"
+
+        file = data_to_bytes(status)
         share_data(
             client=client,
             receivers=["MANAGE"],
@@ -159,7 +266,7 @@ def receive_status_ask(client: Client, data: dict) -> bool:
     except Exception as e:
         logger.warning(f"Receive version ask error: {e}", exc_info=True)
     finally:
-        glovar.locks["regex"].release()
+        glovar.locks["regex"].release_read()
 
     return False
 
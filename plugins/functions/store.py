@@ -0,0 +1,396 @@
+# SCP-079-REGEX - Manage regex patterns
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-REGEX.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from array import array
+from hashlib import sha256
+from collections.abc import MutableMapping
+from copy import deepcopy
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The status of a rule
+Status = Mapping[str, Union[float, int]]
+
+# Type codes of the statistics columns
+columns: Dict[str, str] = {
+    "time": "q",
+    "average": "d",
+    "today": "q",
+    "total": "q",
+    "temp": "q",
+    "who": "q"
+}
+
+# Flags of the rule's comments
+FLAG_TEMP = 1
+FLAG_FOREVER = 2
+
+# Called with the word type, the operation and the changed rules' new status, None if removed
+Hook = Callable[[str, str, Dict[str, Optional[Status]]], bool]
+
+
+class RuleStatus(MutableMapping):
+    # View of a rule's row in the table
+    __slots__ = ("table", "i")
+
+    def __init__(self, table: "RuleTable", i: int) -> None:
+        self.table = table
+        self.i = i
+
+    def __delitem__(self, key: str) -> None:
+        raise TypeError("Column can not be deleted")
+
+    def __getitem__(self, key: str) -> Union[float, int]:
+        return self.table.columns[key][self.i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(columns)
+
+    def __len__(self) -> int:
+        return len(columns)
+
+    def __reduce__(self) -> Tuple[type, Tuple[dict]]:
+        # Pickled as a plain dict
+        return dict, (dict(self),)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __setitem__(self, key: str, value: Union[float, int]) -> None:
+        column = self.table.columns[key]
+        column[self.i] = int(value) if column.typecode == "q" else value
+        self.table.version += 1
+
+
+class RuleRow(Mapping):
+    # Read-only view of a rule's row in a snapshot
+    __slots__ = ("snapshot", "i")
+
+    def __init__(self, snapshot: "RuleSnapshot", i: int) -> None:
+        self.snapshot = snapshot
+        self.i = i
+
+    def __getitem__(self, key: str) -> Union[float, int]:
+        return self.snapshot.columns[key][self.i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(columns)
+
+    def __len__(self) -> int:
+        return len(columns)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class RuleSnapshot(Mapping):
+    # Read-only view of a rule table, over frozen copies of its ids and columns
+    def __init__(self, table: "RuleTable") -> None:
+        self.columns: Dict[str, array] = {key: column[:] for key, column in table.columns.items()}
+        self.ids: Dict[str, int] = dict(table.ids)
+        self.version: int = table.version
+
+    def __getitem__(self, word: str) -> RuleRow:
+        return RuleRow(self, self.ids[word])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def sort(self, key: str, reverse: bool = False) -> List[str]:
+        # Get the words sorted by the column, words with equal values in alphabetical order
+        column = self.columns[key]
+        result = sorted(self.ids)
+        result.sort(key=lambda word: column[self.ids[word]], reverse=reverse)
+
+        return result
+
+
+class RuleTable(MutableMapping):
+    # Statistics of a word type's rules, one array per column, indexed by the rule's id
+    def __init__(self, words: Mapping[str, Mapping[str, Union[float, int]]] = None) -> None:
+        self.columns: Dict[str, array] = {key: array(code) for key, code in columns.items()}
+        self.flags: array = array("B")
+        self.free: List[int] = []
+        self.ids: Dict[str, int] = {}
+        self.revision: int = 0
+        self.version: int = 0
+        self.words: List[Optional[str]] = []
+
+        for word in words or {}:
+            self[word] = words[word]
+
+    def __delitem__(self, word: str) -> None:
+        i = self.ids.pop(word)
+        self.words[i] = None
+        self.flags[i] = 0
+
+        for column in self.columns.values():
+            column[i] = 0
+
+        self.free.append(i)
+        self.revision += 1
+        self.version += 1
+
+    def __getitem__(self, word: str) -> RuleStatus:
+        return RuleStatus(self, self.ids[word])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __reduce__(self) -> Tuple[type, Tuple[dict]]:
+        # Pickled as a plain dict of dicts, the format of the data files and the exchanged updates
+        return dict, ({word: dict(self[word]) for word in self.ids},)
+
+    def __setitem__(self, word: str, status: Mapping[str, Union[float, int]]) -> None:
+        i = self.ids.get(word)
+
+        if i is None:
+            i = self.free.pop() if self.free else len(self.words)
+
+            if i == len(self.words):
+                self.words.append(word)
+                self.flags.append(0)
+
+                for column in self.columns.values():
+                    column.append(0)
+            else:
+                self.words[i] = word
+
+            self.ids[word] = i
+            self.flags[i] = get_flags(word)
+            self.revision += 1
+
+        self.version += 1
+
+        for key, column in self.columns.items():
+            value = status.get(key, 0)
+            column[i] = int(value) if column.typecode == "q" else value
+
+    def count(self, counts: Mapping[str, int], now: int) -> List[str]:
+        # Add the usage counts, return the counted words
+        time, average, today, total = (self.columns[key] for key in ["time", "average", "today", "total"])
+        result = []
+
+        for word in counts:
+            i = self.ids.get(word)
+
+            if i is None:
+                continue
+
+            today[i] += counts[word]
+            total[i] += counts[word]
+            average[i] = total[i] / (max(now - time[i], 1) / 86400)
+            result.append(word)
+
+        self.version += 1
+
+        return result
+
+    def pop(self, word: str, default: Any = None) -> Any:
+        # Remove the rule, return a copy of its status
+        if word not in self.ids:
+            return default
+
+        result = dict(self[word])
+        del self[word]
+
+        return result
+
+    def roll(self, limit: int, ban: bool = False) -> Tuple[array, List[str]]:
+        # Get the next day's temp column, and the words it expires
+        temp = array("q", [0 if t else p + 1 for t, p in zip(self.columns["today"], self.columns["temp"])])
+        expired = [w for w, f, p in zip(self.words, self.flags, temp)
+                   if w is not None and p >= limit and (f & FLAG_TEMP or (ban and not f & FLAG_FOREVER))]
+
+        return temp, expired
+
+    def snapshot(self) -> RuleSnapshot:
+        # Get a read-only copy of the table, should be taken by the writer
+        return RuleSnapshot(self)
+
+    def sort(self, key: str, reverse: bool = False) -> List[str]:
+        # Get the words sorted by the column, words with equal values in alphabetical order
+        column = self.columns[key]
+        result = sorted(self.ids)
+        result.sort(key=lambda word: column[self.ids[word]], reverse=reverse)
+
+        return result
+
+
+class RuleStore:
+    # Registry of the rules of every word type
+    def __init__(self) -> None:
+        self.digests: Dict[str, Tuple[int, str]] = {}
+        self.hooks: List[Hook] = []
+        self.words: Dict[str, RuleTable] = {}
+
+    def __contains__(self, word_type: str) -> bool:
+        return word_type in glovar.regex
+
+    def __getitem__(self, word_type: str) -> RuleTable:
+        # Direct access to the live dict, readers that may race with writers should use a snapshot
+        words = self.words.get(word_type)
+
+        if words is not None:
+            return words
+
+        if word_type not in glovar.regex:
+            raise KeyError(word_type)
+
+        glovar.locks["load"].acquire()
+        try:
+            words = getattr(glovar, f"{word_type}_words")
+
+            if not isinstance(words, RuleTable):
+                words = RuleTable(words)
+                setattr(glovar, f"{word_type}_words", words)
+
+            self.words[word_type] = words
+        finally:
+            glovar.locks["load"].release()
+
+        return words
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(glovar.regex)
+
+    def add(self, word_type: str, word: str, aid: int) -> Status:
+        # Add a rule
+        status = deepcopy(glovar.default_word_status)
+        status["who"] = aid
+        self[word_type][word] = status
+        self.notify(word_type, "add", {word: status})
+
+        return status
+
+    def count(self, word_type: str, counts: Dict[str, int], now: int) -> Dict[str, Status]:
+        # Add the usage counts of the rules
+        words = self[word_type]
+        result = {word: words[word] for word in words.count(counts, now)}
+        self.notify(word_type, "count", result)
+
+        return result
+
+    def digest(self, word_type: str) -> str:
+        # Get the content hash of the word type's rules
+        words = self[word_type]
+        revision, result = self.digests.get(word_type, (-1, ""))
+
+        if revision != words.revision:
+            revision = words.revision
+            result = sha256("\n".join(sorted(words)).encode("utf-8")).hexdigest()
+            self.digests[word_type] = (revision, result)
+
+        return result
+
+    def hook(self, function: Hook) -> Hook:
+        # Register a function called after every change
+        self.hooks.append(function)
+
+        return function
+
+    def notify(self, word_type: str, operation: str, changes: Dict[str, Optional[Status]]) -> bool:
+        # Call the hooks
+        if not changes:
+            return True
+
+        for function in self.hooks:
+            try:
+                function(word_type, operation, changes)
+            except Exception as e:
+                logger.warning(f"Rule store hook {function.__name__} error: {e}", exc_info=True)
+
+        return True
+
+    def remove(self, word_type: str, words: Iterable[str]) -> Dict[str, Status]:
+        # Remove rules, return the removed rules' status
+        result = {}
+
+        for word in words:
+            status = self[word_type].pop(word, None)
+
+            if status is not None:
+                result[word] = status
+
+        self.notify(word_type, "remove", {word: None for word in result})
+
+        return result
+
+    def reset(self, word_type: str) -> bool:
+        # Reset the statistics of all rules
+        words = self[word_type]
+
+        for word in list(words):
+            words[word] = deepcopy(glovar.default_word_status)
+
+        self.notify(word_type, "reset", dict(words))
+
+        return True
+
+    def roll(self, word_type: str, limit: int, ban: bool = False) -> List[str]:
+        # Start a new day, return the expired words, the regex lock is only held to swap the columns
+        words = self[word_type]
+        version = words.version
+        temp, expired = words.roll(limit, ban)
+
+        glovar.locks["regex"].acquire()
+        try:
+            if words.version != version:
+                temp, expired = words.roll(limit, ban)
+
+            words.columns["today"] = array("q", [0]) * len(temp)
+            words.columns["temp"] = temp
+            words.version += 1
+
+            # Notified under the lock as the other writers, the words must not change while they are listed
+            self.notify(word_type, "update", {word: words[word] for word in words})
+        finally:
+            glovar.locks["regex"].release()
+
+        return expired
+
+
+def get_flags(word: str) -> int:
+    # Get the flags of the rule's comments
+    result = 0
+    try:
+        comments = [comment.split(")")[0].strip() for comment in word.split("(?# ")[1:]]
+
+        if any("temp" in comment for comment in comments):
+            result |= FLAG_TEMP
+
+        if any("forever" in comment for comment in comments):
+            result |= FLAG_FOREVER
+    except Exception as e:
+        logger.warning(f"Get flags error: {e}", exc_info=True)
+
+    return result
+
+
+rules = RuleStore()
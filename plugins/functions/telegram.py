@@ -28,6 +28,7 @@ from pyrogram.errors import PeerIdInvalid, QueryIdInvalid
 
 from .. import glovar
 from .etc import t2t, wait_flood
+from .outbox import editbox, outbox
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -37,20 +38,14 @@ def answer_callback(client: Client, callback_query_id: str, text: str, show_aler
     # Answer the callback
     result = None
     try:
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.answer_callback_query(
-                    callback_query_id=callback_query_id,
-                    text=text,
-                    show_alert=show_alert
-                )
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
-            except QueryIdInvalid:
-                return False
+        try:
+            result = editbox.request(0, client.answer_callback_query, {
+                "callback_query_id": callback_query_id,
+                "text": text,
+                "show_alert": show_alert
+            })
+        except QueryIdInvalid:
+            return False
     except Exception as e:
         logger.warning(f"Answer query to {callback_query_id} error: {e}", exc_info=True)
 
@@ -58,7 +53,7 @@ def answer_callback(client: Client, callback_query_id: str, text: str, show_aler
 
 
 def download_media(client: Client, file_id: str, file_ref: str, file_path: str) -> Optional[str]:
-    # Download a media file
+    # Download a media file, not queued in the outbox, a long download would hold up the other calls
     result = None
     try:
         flood_wait = True
@@ -80,22 +75,16 @@ def edit_message_reply_markup(client: Client, cid: int, mid: int,
     # Edit the message's reply markup
     result = None
     try:
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.edit_message_reply_markup(
-                    chat_id=cid,
-                    message_id=mid,
-                    reply_markup=markup
-                )
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
-            except ButtonDataInvalid:
-                logger.warning(f"Edit message {mid} reply markup in {cid} - invalid markup: {markup}")
-            except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
-                return False
+        try:
+            result = editbox.request(cid, client.edit_message_reply_markup, {
+                "chat_id": cid,
+                "message_id": mid,
+                "reply_markup": markup
+            })
+        except ButtonDataInvalid:
+            logger.warning(f"Edit message {mid} reply markup in {cid} - invalid markup: {markup}")
+        except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
+            return False
     except Exception as e:
         logger.warning(f"Edit message {mid} reply markup in {cid} error: {e}", exc_info=True)
 
@@ -110,25 +99,19 @@ def edit_message_text(client: Client, cid: int, mid: int, text: str,
         if not text.strip():
             return None
 
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.edit_message_text(
-                    chat_id=cid,
-                    message_id=mid,
-                    text=text,
-                    parse_mode="html",
-                    disable_web_page_preview=True,
-                    reply_markup=markup
-                )
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
-            except ButtonDataInvalid:
-                logger.warning(f"Edit message {mid} text in {cid} - invalid markup: {markup}")
-            except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
-                return False
+        try:
+            result = editbox.request(cid, client.edit_message_text, {
+                "chat_id": cid,
+                "message_id": mid,
+                "text": text,
+                "parse_mode": "html",
+                "disable_web_page_preview": True,
+                "reply_markup": markup
+            })
+        except ButtonDataInvalid:
+            logger.warning(f"Edit message {mid} text in {cid} - invalid markup: {markup}")
+        except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
+            return False
     except Exception as e:
         logger.warning(f"Edit message {mid} in {cid} error: {e}", exc_info=True)
 
@@ -139,14 +122,7 @@ def get_messages(client: Client, cid: int, mids: Iterable[int]) -> List[Message]
     # Get some messages
     result = []
     try:
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.get_messages(chat_id=cid, message_ids=mids)
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
+        result = outbox.request(0, client.get_messages, {"chat_id": cid, "message_ids": mids})
     except Exception as e:
         logger.warning(f"Get messages error: {e}", exc_info=True)
 
@@ -165,20 +141,13 @@ def get_sticker_title(client: Client, short_name: str, normal: bool = False, pri
 
         sticker_set = InputStickerSetShortName(short_name=short_name)
 
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                the_set = client.send(GetStickerSet(stickerset=sticker_set))
+        the_set = outbox.request(0, client.send, {"data": GetStickerSet(stickerset=sticker_set)})
 
-                if isinstance(the_set, messages_StickerSet):
-                    inner_set = the_set.set
+        if isinstance(the_set, messages_StickerSet):
+            inner_set = the_set.set
 
-                    if isinstance(inner_set, StickerSet):
-                        result = t2t(inner_set.title, normal, printable)
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
+            if isinstance(inner_set, StickerSet):
+                result = t2t(inner_set.title, normal, printable)
 
         glovar.sticker_titles[short_name] = result
     except Exception as e:
@@ -192,28 +161,22 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
     # Send a document to a chat
     result = None
     try:
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.send_document(
-                    chat_id=cid,
-                    document=document,
-                    file_ref=file_ref,
-                    caption=caption,
-                    parse_mode="html",
-                    reply_to_message_id=mid,
-                    reply_markup=markup
-                )
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
-            except ButtonDataInvalid:
-                logger.warning(f"Send document {document} to {cid} - invalid markup: {markup}")
-            except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
-                return False
+        try:
+            result = outbox.request(cid, client.send_document, {
+                "chat_id": cid,
+                "document": document,
+                "file_ref": file_ref,
+                "caption": caption,
+                "parse_mode": "html",
+                "reply_to_message_id": mid,
+                "reply_markup": markup
+            })
+        except ButtonDataInvalid:
+            logger.warning(f"Send document {document} to {cid} - invalid markup: {markup}")
+        except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
+            return False
     except Exception as e:
-        logger.warning(f"Send document {document} to {cid} error: {e}", exec_info=True)
+        logger.warning(f"Send document {document} to {cid} error: {e}", exc_info=True)
 
     return result
 
@@ -226,26 +189,40 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
         if not text.strip():
             return None
 
-        flood_wait = True
-        while flood_wait:
-            flood_wait = False
-            try:
-                result = client.send_message(
-                    chat_id=cid,
-                    text=text,
-                    parse_mode="html",
-                    disable_web_page_preview=True,
-                    reply_to_message_id=mid,
-                    reply_markup=markup
-                )
-            except FloodWait as e:
-                flood_wait = True
-                wait_flood(e)
-            except ButtonDataInvalid:
-                logger.warning(f"Send message to {cid} - invalid markup: {markup}")
-            except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
-                return False
+        try:
+            result = outbox.request(cid, client.send_message, {
+                "chat_id": cid,
+                "text": text,
+                "parse_mode": "html",
+                "disable_web_page_preview": True,
+                "reply_to_message_id": mid,
+                "reply_markup": markup
+            })
+        except ButtonDataInvalid:
+            logger.warning(f"Send message to {cid} - invalid markup: {markup}")
+        except (ChatAdminRequired, PeerIdInvalid, ChannelInvalid, ChannelPrivate):
+            return False
     except Exception as e:
         logger.warning(f"Send message to {cid} error: {e}", exc_info=True)
 
     return result
+
+
+def send_report_message(client: Client, cid: int, text: str) -> bool:
+    # Queue a report message, adjacent reports to the same chat are sent as one message
+    try:
+        if not text.strip():
+            return False
+
+        outbox.request(cid, client.send_message, {
+            "chat_id": cid,
+            "text": text,
+            "parse_mode": "html",
+            "disable_web_page_preview": True
+        }, wait=False, merge=True)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Send report message to {cid} error: {e}", exc_info=True)
+
+    return False
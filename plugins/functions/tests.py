@@ -18,16 +18,14 @@
 
 import logging
 import re
-from copy import deepcopy
 from string import ascii_lowercase
 
 from pyrogram import Client, Message
 
 from .. import glovar
 from .etc import code, get_filename, get_forward_name, get_int, get_text, lang, mention_id, t2t, thread
-from .filters import is_regex_text
+from .filters import is_regex_text_all
 from .telegram import get_sticker_title, send_message
-from .words import is_similar
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -47,10 +45,11 @@ def name_test(client: Client, message: Message) -> bool:
         result = ""
 
         for word_type in ["ad", "con", "iml", "nm", "wb", "test"]:
-            if not is_regex_text(word_type, text):
+            w_list = is_regex_text_all(word_type, text)
+
+            if not w_list:
                 continue
 
-            w_list = [w for w in deepcopy(eval(f"glovar.{word_type}_words")) if is_similar("test", w, text)]
             result += "\t" * 4 + f"{lang(word_type)}：" + "-" * 16 + "\n\n"
 
             for w in w_list:
@@ -86,11 +85,11 @@ def sticker_test(client: Client, message: Message) -> bool:
         result += f"{lang('sticker_name')}{lang('colon')}{code(sticker_name)}\n\n"
 
         for word_type in ["sti", "test"]:
-            if not is_regex_text(word_type, sticker_name):
+            w_list = is_regex_text_all(word_type, sticker_name)
+
+            if not w_list:
                 continue
 
-            w_list = [w for w in deepcopy(eval(f"glovar.{word_type}_words"))
-                      if is_similar("test", w, sticker_name)]
             result += "\t" * 4 + f"{lang(word_type)}：" + "-" * 16 + "\n\n"
 
             for w in w_list:
@@ -101,11 +100,11 @@ def sticker_test(client: Client, message: Message) -> bool:
         sticker_title = t2t(sticker_title, True, True)
 
         for word_type in ["ad", "con", "ban", "sti", "test"]:
-            if not is_regex_text(word_type, sticker_title):
+            w_list = is_regex_text_all(word_type, sticker_title)
+
+            if not w_list:
                 continue
 
-            w_list = [w for w in deepcopy(eval(f"glovar.{word_type}_words"))
-                      if is_similar("test", w, sticker_title)]
             result += "\t" * 4 + f"{lang(word_type)}：" + "-" * 16 + "\n\n"
 
             for w in w_list:
@@ -158,10 +157,11 @@ def text_test(client: Client, message: Message) -> bool:
             if len(result_list[-1]) > 2000:
                 result_list.append("")
 
-            if not is_regex_text(word_type, text):
+            w_list = is_regex_text_all(word_type, text)
+
+            if not w_list:
                 continue
 
-            w_list = [w for w in deepcopy(eval(f"glovar.{word_type}_words")) if is_similar("test", w, text)]
             result_list[-1] += f"{lang(word_type)}：" + "-" * 24 + "\n\n"
 
             for w in w_list:
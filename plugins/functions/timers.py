@@ -22,11 +22,12 @@ from time import sleep
 from pyrogram import Client
 
 from .. import glovar
-from .channel import share_data
-from .etc import code, get_now, lang, mention_id, thread
-from .file import save
-from .telegram import send_message
-from .words import get_comments, words_ask
+from .channel import share_data, share_regex_update
+from .etc import code, get_now, lang, mention_id
+from .file import save, save_thread
+from .store import rules
+from .telegram import send_report_message
+from .words import get_dedupe, words_ask
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -37,9 +38,13 @@ def backup_files(client: Client) -> bool:
     try:
         for file in glovar.file_list:
             # Check
-            if not eval(f"glovar.{file}"):
+            if not getattr(glovar, file):
                 continue
 
+            # Compact the journal
+            if glovar.journals.get(file):
+                save_thread(file)
+
             # Share
             share_data(
                 client=client,
@@ -58,6 +63,19 @@ def backup_files(client: Client) -> bool:
     return False
 
 
+def dedupe_rules() -> bool:
+    # Find the redundant rules of every type ahead of the dedupe command
+    try:
+        for word_type in glovar.regex:
+            get_dedupe(word_type)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Dedupe rules error: {e}", exc_info=True)
+
+    return False
+
+
 def interval_hour_01(client: Client) -> bool:
     # Execute every hour
     try:
@@ -90,30 +108,23 @@ def interval_hour_01(client: Client) -> bool:
 
 def reset_count(client: Client) -> bool:
     # Reset the daily usage
-    glovar.locks["regex"].acquire()
     try:
         for word_type in glovar.regex:
-            deleted_words = {}
-
-            for word in list(eval(f"glovar.{word_type}_words")):
-                today = eval(f"glovar.{word_type}_words")[word]["today"]
-                eval(f"glovar.{word_type}_words")[word]["today"] = 0
-
-                if today == 0:
-                    eval(f"glovar.{word_type}_words")[word]["temp"] += 1
-                else:
-                    eval(f"glovar.{word_type}_words")[word]["temp"] = 0
-
-                comments = get_comments(word)
-
-                if (not any("temp" in comment for comment in comments)
-                        and not (word_type == "ban" and not any("forever" in comment for comment in comments))):
-                    continue
+            # A failed type must not stop the rolling of the others
+            try:
+                expired = rules.roll(word_type, glovar.limit_temp, word_type == "ban")
+            except Exception as e:
+                logger.warning(f"Reset count {word_type} error: {e}", exc_info=True)
+                continue
 
-                if eval(f"glovar.{word_type}_words")[word]["temp"] >= glovar.limit_temp:
-                    deleted_words[word] = eval(f"glovar.{word_type}_words").pop(word, {})
+            if not expired:
+                continue
 
-            save(f"{word_type}_words")
+            glovar.locks["regex"].acquire()
+            try:
+                deleted_words = rules.remove(word_type, expired)
+            finally:
+                glovar.locks["regex"].release()
 
             if not deleted_words:
                 continue
@@ -137,13 +148,31 @@ def reset_count(client: Client) -> bool:
 
                 text += f"{lang('removed')}{lang('colon')}" + "-" * 24 + f"\n\n{end_text}\n"
 
-                thread(send_message, (client, glovar.regex_group_id, text))
+                send_report_message(client, glovar.regex_group_id, text)
 
         return True
     except Exception as e:
         logger.warning(f"Reset count error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
+
+    return False
+
+
+def update_regex(client: Client) -> bool:
+    # Share full regex updates of the types changed since their last full update
+    try:
+        for word_type in glovar.regex:
+            update = glovar.updates[word_type]
+
+            if (update["version"] == update["full"]
+                    and not update["added"]
+                    and not update["removed"]):
+                continue
+
+            share_regex_update(client, word_type, True)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update regex error: {e}", exc_info=True)
 
     return False
 
@@ -18,19 +18,19 @@
 
 import logging
 import re
-from copy import deepcopy
 from json import dumps
 from string import ascii_lowercase
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 from pyrogram import Client, InlineKeyboardMarkup, InlineKeyboardButton, Message
 
 from .. import glovar
-from .channel import share_regex_update
-from .etc import code, button_data, get_command_context, get_int, get_list_page, get_now, get_text, italic, lang
-from .etc import mention_id, random_str, thread
-from .file import save, save_thread
-from .filters import is_similar
+from .channel import share_regex_update, update_regex_delta
+from .etc import code, button_data, get_command_context, get_command_type, get_int, get_list_page, get_now, get_text
+from .etc import italic, lang, mention_id, random_str, thread
+from .file import journal, save
+from .filters import find_words, get_equivalent, get_redundant, get_similar, is_similar, update_patterns
+from .store import RuleSnapshot, RuleTable, Status, rules
 from .telegram import send_message
 
 # Enable logging
@@ -40,9 +40,7 @@ logger = logging.getLogger(__name__)
 def add_word(word_type: str, word: str, aid: int) -> bool:
     # Add a word
     try:
-        eval(f"glovar.{word_type}_words")[word] = deepcopy(glovar.default_word_status)
-        eval(f"glovar.{word_type}_words")[word]["who"] = aid
-        save_thread(f"{word_type}_words")
+        rules.add(word_type, word, aid)
 
         return True
     except Exception as e:
@@ -119,6 +117,53 @@ def get_comments(regex: str) -> List[str]:
     return result
 
 
+def get_dedupe(word_type: str) -> List[Tuple[str, str, List[Tuple[str, str]]]]:
+    # Get the clusters of the redundant rules of the word type, its parent and child types
+    result = []
+    try:
+        key = "ad_" if word_type in {f"ad{c}" for c in ascii_lowercase} else word_type
+        expand = (lambda x: [f"ad{c}" for c in ascii_lowercase] if x == "ad_" else [x])
+        parents = [t for p in glovar.contains if key in glovar.contains[p] for t in expand(p) if t in glovar.regex]
+        children = [t for c in glovar.contains.get(key, set()) for t in expand(c) if t in glovar.regex]
+
+        # Use the cached result if no rules were added or removed, the statistics do not matter
+        revisions = {t: rules[t].revision for t in [word_type] + parents + children}
+        cached = glovar.dedupes.get(word_type)
+
+        if cached and cached["revisions"] == revisions:
+            return cached["result"]
+
+        # The rules found by a rule of the same type or a parent type, and the child types' rules found by the type
+        redundant: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+        for word, keeper in get_redundant(word_type, [word_type] + parents, get_snapshot(word_type)).items():
+            redundant[(word_type, word)] = keeper
+
+        for child in children:
+            for word, keeper in get_redundant(child, [word_type], get_snapshot(child)).items():
+                redundant[(child, word)] = keeper
+
+        # Merge the chains into clusters
+        clusters: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+
+        for item in redundant:
+            root = redundant[item]
+            visited = {item}
+
+            while root in redundant and root not in visited:
+                visited.add(root)
+                root = redundant[root]
+
+            clusters.setdefault(root, []).append(item)
+
+        result = [(t, w, sorted(clusters[(t, w)])) for t, w in sorted(clusters)]
+        glovar.dedupes[word_type] = {"revisions": revisions, "result": result}
+    except Exception as e:
+        logger.warning(f"Get dedupe error: {e}", exc_info=True)
+
+    return result
+
+
 def get_desc(message: Message) -> bool:
     # Get the list message's desc value
     try:
@@ -139,7 +184,7 @@ def get_desc(message: Message) -> bool:
 
 
 def get_duplicated(word_type: str, word: str) -> Set[str]:
-    # Get duplicated word types
+    # Get duplicated word types, which have the word or an equivalent rule
     result = set()
     try:
         if word_type in {f"ad{c}" for c in ascii_lowercase}:
@@ -149,10 +194,10 @@ def get_duplicated(word_type: str, word: str) -> Set[str]:
         for w_t in glovar.contains.get(word_type, set()):
             if w_t == "ad_":
                 for c in ascii_lowercase:
-                    if word in eval(f"glovar.ad{c}_words"):
+                    if word in rules[f"ad{c}"] or get_equivalent(f"ad{c}", word):
                         result.add(f"ad{c}")
             else:
-                if word in eval(f"glovar.{w_t}_words"):
+                if word in rules[w_t] or get_equivalent(w_t, word):
                     result.add(w_t)
 
         # Current word type as child
@@ -162,10 +207,10 @@ def get_duplicated(word_type: str, word: str) -> Set[str]:
 
             if w_t == "ad_":
                 for c in ascii_lowercase:
-                    if word in eval(f"glovar.ad{c}_words"):
+                    if word in rules[f"ad{c}"] or get_equivalent(f"ad{c}", word):
                         result.add(f"ad{c}")
             else:
-                if word in eval(f"glovar.{w_t}_words"):
+                if word in rules[w_t] or get_equivalent(w_t, word):
                     result.add(w_t)
     except Exception as e:
         logger.warning(f"Get duplicated error: {e}", exc_info=True)
@@ -216,15 +261,25 @@ def get_same_types(regex: str) -> Set[str]:
     return set()
 
 
+def get_snapshot(word_type: str) -> RuleSnapshot:
+    # Get the read-only snapshot of the word type's data
+    result = RuleTable().snapshot()
+    try:
+        if glovar.snapshots.get(word_type) is None:
+            update_snapshot(word_type)
+
+        result = glovar.snapshots[word_type]["words"]
+    except Exception as e:
+        logger.warning(f"Get snapshot error: {e}", exc_info=True)
+
+    return result
+
+
 def remove_word(word_type: str, words: List[str], aid: int) -> Set[int]:
     # Remove a word
     result = set()
     try:
-        for word in words:
-            word_status = eval(f"glovar.{word_type}_words").pop(word, {})
-            result.add(word_status.get("who"))
-
-        save_thread(f"{word_type}_words")
+        result = {status.get("who") for status in rules.remove(word_type, words).values()}
         result.discard(aid)
         result = {cc_id for cc_id in list(result) if cc_id}
     except Exception as e:
@@ -253,6 +308,67 @@ def same_word(client: Client, message: Message, command: str, word: str, word_ty
     return False
 
 
+def search_words(mode: str, word_type: str, word: str) -> List[str]:
+    # Get the rules of the word type matched by the search, the find mode only checks the indexed candidates
+    result = []
+    try:
+        words = get_snapshot(word_type)
+        found = find_words(word_type, word) if mode == "find" else None
+
+        if found is not None:
+            result = [w for w in found if w in words]
+        else:
+            result = [w for w in words if is_similar(mode, w, word, word_type)]
+    except Exception as e:
+        logger.warning(f"Search words error: {e}", exc_info=True)
+
+    return result
+
+
+@rules.hook
+def update_rules(word_type: str, operation: str, changes: Dict[str, Optional[Status]]) -> bool:
+    # Keep the patterns, the delta, the snapshot and the journal up to date with the rules
+    try:
+        file = f"{word_type}_words"
+
+        if operation in {"add", "remove"}:
+            added = [word for word in changes if changes[word] is not None]
+            removed = [word for word in changes if changes[word] is None]
+            update_patterns(word_type, added, removed)
+            update_regex_delta(word_type, added, removed)
+
+        update_snapshot(word_type)
+
+        # Save the whole file instead of journaling a large change
+        if len(changes) >= glovar.journal_limit:
+            save(file)
+        else:
+            journal(file, [(operation, word, changes[word]) for word in changes])
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update rules error: {e}", exc_info=True)
+
+    return False
+
+
+def update_snapshot(word_type: str) -> bool:
+    # Publish a new snapshot of the word type's data, should be called by the writer after each change
+    try:
+        words = rules[word_type]
+        version = glovar.snapshots.get(word_type, {}).get("version", 0) + 1
+        glovar.snapshots[word_type] = {
+            "version": version,
+            "words": words.snapshot()
+        }
+
+        return True
+    except Exception as e:
+        logger.warning(f"Update snapshot error: {e}", exc_info=True)
+
+    return False
+
+
 def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
     # Add a word
     text = ""
@@ -285,7 +401,7 @@ def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
         text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
         # Check if the word already exits
-        if eval(f"glovar.{word_type}_words").get(word, {}):
+        if rules[word_type].get(word, {}):
             text += (f"{lang('status')}{lang('colon')}{code(lang('status_failed'))}\n"
                      f"{lang('reason')}{lang('colon')}{code(lang('reason_existed'))}\n")
             return text, markup
@@ -335,9 +451,7 @@ def word_add(client: Client, message: Message) -> (str, InlineKeyboardMarkup):
             "type": word_type
         }
 
-        for old in list(eval(f"glovar.{word_type}_words")):
-            if is_similar("strict", old, word):
-                glovar.ask_words[key]["old"].append(old)
+        glovar.ask_words[key]["old"] = get_similar(word_type, word)
 
         if glovar.ask_words[key]["old"]:
             end_text = "\n\n".join(code(w) for w in glovar.ask_words[key]["old"])
@@ -456,6 +570,71 @@ def words_ask(client: Client, operation: str, key: str) -> (str, Set[int]):
     return text, cc_list
 
 
+def words_dedupe(message: Message) -> (str, InlineKeyboardMarkup):
+    # Find the redundant words
+    text = ""
+    markup = None
+    try:
+        # Basic data
+        aid = message.from_user.id
+
+        # Text prefix
+        text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n"
+                f"{lang('action')}{lang('colon')}{code(lang('action_dedupe'))}\n")
+
+        # Check command format
+        word_type = get_command_type(message)
+
+        if word_type not in glovar.regex:
+            text += (f"{lang('type')}{lang('colon')}{code(word_type or lang('unknown'))}\n"
+                     f"{lang('status')}{lang('colon')}{code(lang('status_failed'))}\n"
+                     f"{lang('reason')}{lang('colon')}{code(lang('command_usage'))}\n")
+            return text, markup
+
+        text, markup = words_dedupe_page(aid, word_type, 1)
+    except Exception as e:
+        logger.warning(f"Words dedupe error: {e}", exc_info=True)
+
+    return text, markup
+
+
+def words_dedupe_page(aid: int, word_type: str, page: int) -> (str, InlineKeyboardMarkup):
+    # Generate a page of the redundant words' merge proposal
+    text = ""
+    markup = None
+    try:
+        # Text prefix
+        text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n"
+                f"{lang('action')}{lang('colon')}{code(lang('action_dedupe'))}\n"
+                f"{lang('type')}{lang('colon')}{code(lang(word_type))}\n")
+
+        if glovar.comments.get(word_type):
+            text += f"{lang('comment')}{lang('colon')}{code(glovar.comments[word_type])}\n"
+
+        # Get the clusters
+        clusters = get_dedupe(word_type)
+
+        if not clusters:
+            text += (f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
+                     f"{lang('result')}{lang('colon')}{code(lang('reason_none'))}\n")
+            return text, markup
+
+        c_list = [f"{code(keeper)} {italic(lang(keeper_type))}\n"
+                  + "\n".join("\t" * 4 + f"{code(w)} {italic(lang(t))}" for t, w in items)
+                  for keeper_type, keeper, items in clusters]
+        per_page = min(3000 // max(len(c) for c in c_list), glovar.per_page) or 1
+        c_list, markup = get_list_page(c_list, "dedupe", word_type, page, per_page)
+
+        # Generate the text
+        end_text = "\n\n".join(c_list)
+        text += (f"{lang('redundant')}{lang('colon')}{code(sum(len(items) for _, _, items in clusters))}\n"
+                 f"{lang('result')}{lang('colon')}" + "-" * 24 + f"\n\n{end_text}\n")
+    except Exception as e:
+        logger.warning(f"Words dedupe page error: {e}", exc_info=True)
+
+    return text, markup
+
+
 def words_list(message: Message) -> (str, InlineKeyboardMarkup):
     # List words
     text = ""
@@ -529,10 +708,8 @@ def words_list_page(aid: int, word_type: str, page: int, desc: bool) -> (str, In
                 f"{lang('action')}{lang('colon')}{code(lang('action_list'))}\n")
 
         # Get words
-        words = eval(f"glovar.{word_type}_words")
-        keys = list(words.keys())
-        keys.sort()
-        w_list = sorted(keys, key=lambda k: words[k]["average"], reverse=desc)
+        words = get_snapshot(word_type)
+        w_list = words.sort("average", desc)
 
         # Get the list and generate the markup
         if w_list:
@@ -645,7 +822,7 @@ def word_remove_try(client: Client, message: Message) -> (str, Set[int]):
         text += f"{lang('word')}{lang('colon')}{code(word)}\n"
 
         # Check if the word exists
-        if not eval(f"glovar.{word_type}_words").get(word, {}):
+        if not rules[word_type].get(word, {}):
             text += (f"{lang('status')}{lang('colon')}{code(lang('status_failed'))}\n"
                      f"{lang('reason')}{lang('colon')}{code(lang('reason_not_exist'))}\n")
 
@@ -714,17 +891,13 @@ def words_search(message: Message, mode: str) -> (str, InlineKeyboardMarkup):
 
         if word_type == "all":
             for n in glovar.regex:
-                for w in eval(f"glovar.{n}_words"):
-                    if not is_similar(mode, w, word):
-                        continue
-
+                for w in search_words(mode, n, word):
                     if result.get(w) is None:
                         result[w] = []
 
                     result[w].append(n)
         else:
-            result = {w: [] for w in eval(f"glovar.{word_type}_words")
-                      if is_similar(mode, w, word)}
+            result = {w: [] for w in search_words(mode, word_type, word)}
 
         glovar.result_search[key]["result"] = result
         text, markup = words_search_page(aid, key, 1)
@@ -779,7 +952,7 @@ def words_search_page(aid: int, key: str, page: int) -> (str, InlineKeyboardMark
                                    + italic(lang('comma').join(lang(t) for t in result[w]))
                                    for w in w_list)
         else:
-            words = eval(f"glovar.{word_type}_words")
+            words = get_snapshot(word_type)
             end_text = "\n\n".join((f"{code(w)}\n"
                                     f"{italic(round(words[w]['average'], 1))} {code('/')} "
                                     f"{italic(words[w]['today'])} {code('/')} "
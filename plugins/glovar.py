@@ -19,13 +19,16 @@
 import logging
 import pickle
 from configparser import RawConfigParser
-from os import mkdir
+from functools import partial
+from os import mkdir, remove
 from os.path import exists
-from shutil import rmtree
+from shutil import copyfile, rmtree
 from string import ascii_lowercase
-from threading import Lock
+from threading import Lock, RLock, Thread
 from time import time
-from typing import Dict, List, Set, Union
+from typing import Any, Callable, Dict, List, Mapping, Optional, Pattern, Set, Tuple, Union
+
+from .functions.lock import RWLock
 
 # Enable logging
 logging.basicConfig(
@@ -54,11 +57,15 @@ test_group_id: int = 0
 # [custom]
 aio: Union[bool, str] = ""
 backup: Union[bool, str] = ""
+combine: Union[bool, str] = "True"
+compress: str = "zlib"
 date_reset: str = ""
 limit_temp: int = 0
 per_page: int = 0
 project_link: str = ""
 project_name: str = ""
+save_interval: int = 5
+warm_up: Union[bool, str] = "True"
 zh_cn: Union[bool, str] = ""
 
 # [encrypt]
@@ -86,11 +93,17 @@ try:
     aio = eval(aio)
     backup = config["custom"].get("backup", backup)
     backup = eval(backup)
+    combine = config["custom"].get("combine", combine)
+    combine = eval(combine)
+    compress = config["custom"].get("compress", compress)
     date_reset = config["custom"].get("date_reset", date_reset)
     limit_temp = int(config["custom"].get("limit_temp", str(limit_temp)))
     per_page = int(config["custom"].get("per_page", str(per_page)))
     project_link = config["custom"].get("project_link", project_link)
     project_name = config["custom"].get("project_name", project_name)
+    save_interval = int(config["custom"].get("save_interval", str(save_interval)))
+    warm_up = config["custom"].get("warm_up", warm_up)
+    warm_up = eval(warm_up)
     zh_cn = config["custom"].get("zh_cn", zh_cn)
     zh_cn = eval(zh_cn)
 
@@ -112,11 +125,15 @@ if (bot_token in {"", "[DATA EXPUNGED]"}
         or regex_group_id == 0
         or aio not in {False, True}
         or backup not in {False, True}
+        or combine not in {False, True}
+        or compress not in {"", "lzma", "zlib"}
         or date_reset in {"", "[DATA EXPUNGED]"}
         or limit_temp == 0
         or per_page == 0
         or project_link in {"", "[DATA EXPUNGED]"}
         or project_name in {"", "[DATA EXPUNGED]"}
+        or save_interval <= 0
+        or warm_up not in {False, True}
         or zh_cn not in {False, True}
         or key in {b"", b"[DATA EXPUNGED]", "", "[DATA EXPUNGED]"}
         or password in {"", "[DATA EXPUNGED]"}):
@@ -213,6 +230,7 @@ lang: Dict[str, str] = {
     "action_check": (zh_cn and "查询数据") or "Check the Count Data",
     "action_comment": (zh_cn and "添加备注") or "Add Comment",
     "action_count": (zh_cn and "请求统计") or "Request Statistics",
+    "action_dedupe": (zh_cn and "查找冗余规则") or "Find Redundant Rules",
     "action_escape": (zh_cn and "转义字符") or "Escape",
     "action_list": (zh_cn and "查看列表") or "Show the List",
     "action_match": (zh_cn and "匹配结果") or "Show Match Result",
@@ -243,6 +261,7 @@ lang: Dict[str, str] = {
     "reason_not_found": (zh_cn and "没有找到") or "Not Found",
     "reason_not_specific": (zh_cn and "不具有特殊性") or "Not specific",
     "reason_wait": (zh_cn and "等待确认") or "Wait for Confirmation",
+    "redundant": (zh_cn and "冗余") or "Redundant",
     "removed": (zh_cn and "移除") or "Removed",
     "replaced": (zh_cn and "替换") or "Replaced",
     "s": (zh_cn and "宽松搜索") or "Loose Search",
@@ -275,6 +294,7 @@ all_commands += [
     "check",
     "comment",
     "count",
+    "dedupe",
     "escape",
     "findall",
     "group",
@@ -299,6 +319,32 @@ contains: Dict[str, Set[str]] = {
     "wd": {"adi", "con", "spe", "tgp"}
 }
 
+counts: Dict[str, Dict[str, int]] = {}
+# counts = {
+#     "type": {
+#         "regex": 3
+#     }
+# }
+
+decompressors: Set[str] = set()
+# decompressors = {"NOSPAM"}
+
+dedupes: Dict[str, Dict[str, Union[Dict[str, int], List[Tuple[str, str, List[Tuple[str, str]]]]]]] = {}
+# dedupes = {
+#     "type": {
+#         "revisions": {
+#             "type": 3,
+#             "child_type": 5
+#         },
+#         "result": [
+#             ("type", "keeper", [("type", "regex"), ("child_type", "regex")])
+#         ]
+#     }
+# }
+
+deltas: Set[str] = set()
+# deltas = {"NOSPAM"}
+
 default_word_status: Dict[str, Union[float, int]] = {
     "time": int(time()),
     "average": 0.0,
@@ -308,12 +354,41 @@ default_word_status: Dict[str, Union[float, int]] = {
     "who": 0
 }
 
-locks: Dict[str, Lock] = {
+dirty_files: Set[str] = set()
+# dirty_files = {"type_words"}
+
+edit_limits: Dict[str, Tuple[float, int]] = {
+    "all": (30.0, 30),
+    "group": (1.0, 3),
+    "private": (1.0, 3)
+}
+# edit_limits = {
+#     "kind": (tokens_per_second, bucket_size)
+# }
+
+journal_limit: int = 1000
+
+locks: Dict[str, Union[Lock, RWLock]] = {
+    "count": Lock(),
+    "journal": Lock(),
+    "load": RLock(),
     "receive": Lock(),
-    "regex": Lock(),
+    "regex": RWLock(),
     "test": Lock()
 }
 
+queue_size: int = 256
+
+sample_size: int = 3
+
+queues: Dict[str, int] = {
+    "cpu": 2,
+    "exchange": 2,
+    "io": 4,
+    "send": 2,
+    "telegram": 8
+}
+
 receivers: Dict[str, List[str]] = {
     "ad": ["AVATAR", "CAPTCHA", "CLEAN", "LANG", "LONG", "NOPORN", "NOSPAM", "RECHECK", "TIP", "WATCH"],
     "ava": ["NOSPAM"],
@@ -385,6 +460,22 @@ result_search: Dict[str, Dict[str, Union[str, Dict[str, List[str]]]]] = {}
 
 sender: str = "REGEX"
 
+send_limits: Dict[str, Tuple[float, int]] = {
+    "all": (30.0, 30),
+    "group": (20 / 60, 3),
+    "private": (1.0, 3)
+}
+# send_limits = {
+#     "kind": (tokens_per_second, bucket_size)
+# }
+
+share_interval: int = 5
+
+shares: Dict[str, bool] = {}
+# shares = {
+#     "type": False
+# }
+
 should_hide: bool = False
 
 sticker_titles: Dict[str, str] = {}
@@ -428,9 +519,6 @@ comments: Dict[str, str] = {}
 
 # Init word variables
 
-for word_type in regex:
-    locals()[f"{word_type}_words"]: Dict[str, Dict[str, Union[float, int]]] = {}
-
 # type_words = {
 #     "regex": {
 #         "time": 15112345678,
@@ -442,33 +530,74 @@ for word_type in regex:
 #     }
 # }
 
+# type_dict = {
+#     "a": "A"
+# }
+
 # Load data
 file_list: List[str] = ["ask_words", "comments"]
 file_list += [f"{f}_words" for f in regex]
 
-for file in file_list:
+journals: Dict[str, int] = {file: 0 for file in file_list}
+# journals = {
+#     "type_words": 12
+# }
+
+
+def load_data(file: str) -> Any:
+    # Load data from pickle, then replay and compact its journal
+    data = {}
+
     try:
         try:
             if exists(f"data/{file}") or exists(f"data/.{file}"):
                 with open(f"data/{file}", "rb") as f:
-                    locals()[f"{file}"] = pickle.load(f)
+                    data = pickle.load(f)
             else:
                 with open(f"data/{file}", "wb") as f:
-                    pickle.dump(eval(f"{file}"), f)
+                    pickle.dump(data, f)
         except Exception as e:
             logger.error(f"Load data {file} error: {e}", exc_info=True)
 
             with open(f"data/.{file}", "rb") as f:
-                locals()[f"{file}"] = pickle.load(f)
+                data = pickle.load(f)
     except Exception as e:
         logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
         raise SystemExit("[DATA CORRUPTION]")
 
-# Generate special characters dictionary
-for special in ["spc", "spe"]:
-    locals()[f"{special}_dict"]: Dict[str, str] = {}
+    if not exists(f"data/{file}.log"):
+        return data
+
+    with open(f"data/{file}.log", "rb") as f:
+        while True:
+            try:
+                operation, rule, status = pickle.load(f)
+            except EOFError:
+                break
+            except Exception as e:
+                logger.warning(f"Replay journal {file} error: {e}", exc_info=True)
+                break
+
+            if operation == "remove":
+                data.pop(rule, None)
+            else:
+                data[rule] = status
+
+    # Compact the replayed journal, a damaged tail must not be followed by new records
+    with open(f"data/.{file}", "wb") as f:
+        pickle.dump(data, f)
+
+    copyfile(f"data/.{file}", f"data/{file}")
+    remove(f"data/{file}.log")
+
+    return data
+
+
+def load_special(special: str) -> Dict[str, str]:
+    # Generate special characters dictionary
+    data = {}
 
-    for rule in locals()[f"{special}_words"]:
+    for rule in __getattr__(f"{special}_words"):
         # Check keys
         if "[" not in rule:
             continue
@@ -481,9 +610,122 @@ for special in ["spc", "spe"]:
         value = rule.split("?#")[1][1]
 
         for k in keys:
-            locals()[f"{special}_dict"][k] = value
+            data[k] = value
+
+    return data
+
+
+loaders: Dict[str, Callable[[], Any]] = {file: partial(load_data, file) for file in file_list}
+loaders.update({f"{special}_dict": partial(load_special, special) for special in ["spc", "spe"]})
+
+
+def __getattr__(name: str) -> Any:
+    # Load the word type's data on first access
+    if name not in loaders:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    with locks["load"]:
+        if name not in globals():
+            globals()[name] = loaders[name]()
+
+    return globals()[name]
+
+
+ask_words = load_data("ask_words")
+comments = load_data("comments")
+
+# Init pattern variables, the patterns are compiled on first use
+compiled: Dict[str, Dict[str, Pattern]] = {}
+# compiled = {
+#     "type": {
+#         "regex": re.compile("regex", re.I | re.M | re.S)
+#     }
+# }
+
+forms: Dict[str, Optional[Dict[str, Set[str]]]] = {}
+# forms = {
+#     "type": {
+#         "3f2a9c...": {"regex", "(?:regex)"}
+#     }
+# }
+
+grams: Dict[str, Dict[str, Set[str]]] = {}
+# grams = {
+#     "type": {
+#         "reg": {"regex", "reg(ex)?"}
+#     }
+# }
+
+matchers: Dict[str, Dict[bool, Dict[str, list]]] = {}
+# matchers = {
+#     "type": {
+#         False: {
+#             "words": ["ad1", "[0-9]{9}", "ad2", "[a-z]{9}", "(a)\\1"],
+#             "patterns": [re.compile("ad1"), re.compile("[0-9]{9}"), ...],
+#             "automaton": ([{"a": 1}, {"d": 2}, {}], [0, 0, 0], [[], [], ["ad"]]),
+#             "keys": {"ad": [0, 2]},
+#             "chunks": [(re.compile("(?P<r0>[0-9]{9})|(?P<r1>[a-z]{9})"), [1, 3])],
+#             "singles": [4]
+#         }
+#     }
+# }
+
+literals: Dict[str, Dict[str, Optional[Set[str]]]] = {}
+# literals = {
+#     "type": {
+#         "regex": {"regex"}
+#     }
+# }
+
+alphabets: Dict[str, Dict[str, Optional[Set[str]]]] = {}
+# alphabets = {
+#     "type": {
+#         "regex": {"r", "e", "g", "x"}
+#     }
+# }
+
+samples: Dict[str, Dict[str, List[str]]] = {}
+# samples = {
+#     "type": {
+#         "reg(ex)?": ["regex", "reg", "regex"]
+#     }
+# }
+
+snapshots: Dict[str, Dict[str, Union[int, Mapping[str, Mapping[str, Union[float, int]]]]]] = {}
+# snapshots = {
+#     "type": {
+#         "version": 1,
+#         "words": RuleSnapshot({
+#             "regex": RuleRow({"time": 15112345678, "average": 1.1, ...})
+#         })
+#     }
+# }
+
+updates: Dict[str, Dict[str, Union[int, Set[str], Dict[str, str]]]] = {}
+# updates = {
+#     "type": {
+#         "version": 3,
+#         "full": 1,
+#         "added": {"regex1"},
+#         "removed": {"regex2"},
+#         "acks": {
+#             "NOSPAM": "sha256"
+#         }
+#     }
+# }
+
+for word_type in regex:
+    matchers[word_type] = {}
+    literals[word_type] = {}
+    alphabets[word_type] = {}
+    samples[word_type] = {}
+    updates[word_type] = {"version": 0, "full": 0, "added": set(), "removed": set(), "acks": {}}
 
 # Start program
 copyright_text = (f"SCP-079-{sender} v{version}, Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>\n"
                   "Licensed under the terms of the GNU General Public License v3 or later (GPLv3+)\n")
 print(copyright_text)
+
+# Load the rest of the data in background
+if warm_up:
+    Thread(target=lambda: [__getattr__(name) for name in loaders], daemon=True).start()
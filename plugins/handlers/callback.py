@@ -24,7 +24,8 @@ from pyrogram import Client, CallbackQuery
 from .. import glovar
 from ..functions.etc import get_now, lang, mention_id, thread
 from ..functions.filters import regex_group
-from ..functions.words import cc, get_admin, get_desc, words_ask, words_list_page, words_search_page
+from ..functions.words import cc, get_admin, get_desc, words_ask, words_dedupe_page, words_list_page
+from ..functions.words import words_search_page
 from ..functions.telegram import answer_callback, edit_message_reply_markup, edit_message_text
 
 # Enable logging
@@ -34,7 +35,6 @@ logger = logging.getLogger(__name__)
 @Client.on_callback_query(regex_group)
 def answer(client: Client, callback_query: CallbackQuery) -> bool:
     # Answer the callback query
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = callback_query.message.chat.id
@@ -61,7 +61,12 @@ def answer(client: Client, callback_query: CallbackQuery) -> bool:
         # Answer the words ask
         if action == "ask":
             text = f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n"
-            result_text, cc_list = words_ask(client, action_type, data)
+
+            glovar.locks["regex"].acquire()
+            try:
+                result_text, cc_list = words_ask(client, action_type, data)
+            finally:
+                glovar.locks["regex"].release()
 
             if not result_text:
                 return True
@@ -70,6 +75,13 @@ def answer(client: Client, callback_query: CallbackQuery) -> bool:
             edit_message_text(client, cid, mid, text)
             cc(client, cc_list, aid, mid)
 
+        # List the redundant words
+        elif action == "dedupe":
+            word_type = action_type
+            page = data
+            text, markup = words_dedupe_page(uid, word_type, page)
+            edit_message_text(client, cid, mid, text, markup)
+
         # List the word
         elif action == "list":
             word_type = action_type
@@ -90,7 +102,5 @@ def answer(client: Client, callback_query: CallbackQuery) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Answer callback error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
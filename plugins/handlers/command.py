@@ -18,7 +18,6 @@
 
 import logging
 import re
-from copy import deepcopy
 from string import ascii_lowercase
 from subprocess import run, PIPE
 
@@ -32,10 +31,12 @@ from ..functions.etc import mention_id, message_link, thread
 from ..functions.file import save
 from ..functions.filters import from_user, regex_group, test_group
 from ..functions.group import get_message
+from ..functions.store import rules
 from ..functions.telegram import edit_message_text, send_message
 from ..functions.tests import name_test, sticker_test, text_test
-from ..functions.words import cc, get_admin, get_desc, get_match, get_same_types, same_word, word_add, words_ask
-from ..functions.words import words_list, words_list_page, word_remove, words_search, words_search_page
+from ..functions.words import cc, get_admin, get_desc, get_match, get_same_types, get_snapshot, same_word
+from ..functions.words import word_add, words_ask, words_dedupe, words_dedupe_page, words_list, words_list_page
+from ..functions.words import word_remove, words_search, words_search_page
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -146,7 +147,7 @@ def ask_word(client: Client, message: Message) -> bool:
                    & from_user)
 def captcha(client: Client, message: Message) -> bool:
     # Request CAPTCHA failure data
-    glovar.locks["regex"].acquire()
+    glovar.locks["regex"].acquire_read()
     try:
         # Basic data
         cid = message.chat.id
@@ -175,7 +176,7 @@ def captcha(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Count words error: {e}", exc_info=True)
     finally:
-        glovar.locks["regex"].release()
+        glovar.locks["regex"].release_read()
 
     return False
 
@@ -185,7 +186,6 @@ def captcha(client: Client, message: Message) -> bool:
                    & from_user)
 def check(client: Client, message: Message) -> bool:
     # Check the regex's count
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = message.chat.id
@@ -200,7 +200,7 @@ def check(client: Client, message: Message) -> bool:
         word_type, word = get_command_context(message)
 
         if word_type and word_type in glovar.regex and word:
-            words = eval(f"glovar.{word_type}_words")
+            words = get_snapshot(word_type)
 
             text += f"{lang('type')}{lang('colon')}{code(lang(word_type))}\n"
 
@@ -230,8 +230,6 @@ def check(client: Client, message: Message) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Check error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
 
@@ -287,7 +285,7 @@ def comments_words(client: Client, message: Message) -> bool:
                    & from_user)
 def count_words(client: Client, message: Message) -> bool:
     # Count words
-    glovar.locks["regex"].acquire()
+    glovar.locks["regex"].acquire_read()
     try:
         # Basic data
         cid = message.chat.id
@@ -322,7 +320,28 @@ def count_words(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Count words error: {e}", exc_info=True)
     finally:
-        glovar.locks["regex"].release()
+        glovar.locks["regex"].release_read()
+
+    return False
+
+
+@Client.on_message(Filters.incoming & Filters.group & Filters.command(["dedupe"], glovar.prefix)
+                   & regex_group
+                   & from_user)
+def dedupe_words(client: Client, message: Message) -> bool:
+    # Find redundant words
+    try:
+        # Basic data
+        cid = message.chat.id
+        mid = message.message_id
+
+        # Send the report message
+        text, markup = words_dedupe(message)
+        thread(send_message, (client, cid, text, mid, markup))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Dedupe words error: {e}", exc_info=True)
 
     return False
 
@@ -451,12 +470,14 @@ def page_command(client: Client, message: Message) -> bool:
                 callback_data_list = get_callback_data(r_message)
                 i = (lambda x: 0 if x == "previous" else -1)(the_type)
 
-                if callback_data_list and callback_data_list[i]["a"] in {"list", "search"}:
+                if callback_data_list and callback_data_list[i]["a"] in {"dedupe", "list", "search"}:
                     action = callback_data_list[i]["a"]
                     action_type = callback_data_list[i]["t"]
                     page = callback_data_list[i]["d"]
 
-                    if action == "list":
+                    if action == "dedupe":
+                        page_text, markup = words_dedupe_page(uid, action_type, page)
+                    elif action == "list":
                         desc = get_desc(r_message)
                         page_text, markup = words_list_page(uid, action_type, page, desc)
                     else:
@@ -491,7 +512,7 @@ def page_command(client: Client, message: Message) -> bool:
                    & from_user)
 def push_words(client: Client, message: Message) -> bool:
     # Push words
-    glovar.locks["regex"].acquire()
+    glovar.locks["regex"].acquire_read()
     try:
         # Basic data
         cid = message.chat.id
@@ -506,7 +527,7 @@ def push_words(client: Client, message: Message) -> bool:
         command_type = get_command_type(message)
 
         if command_type in glovar.regex:
-            share_regex_update(client, command_type)
+            share_regex_update(client, command_type, True)
 
             text += f"{lang('type')}{lang('colon')}{code(lang(command_type))}\n"
 
@@ -516,7 +537,7 @@ def push_words(client: Client, message: Message) -> bool:
             text += f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
         elif command_type == "all":
             for word_type in glovar.regex:
-                thread(share_regex_update, (client, word_type))
+                share_regex_update(client, word_type, True)
 
             text += (f"{lang('type')}{lang('colon')}{code(lang('all'))}\n"
                      f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n")
@@ -532,7 +553,7 @@ def push_words(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Push words error: {e}", exc_info=True)
     finally:
-        glovar.locks["regex"].release()
+        glovar.locks["regex"].release_read()
 
     return False
 
@@ -542,7 +563,6 @@ def push_words(client: Client, message: Message) -> bool:
                    & from_user)
 def regex(client: Client, message: Message) -> bool:
     # Force regex test
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = message.chat.id
@@ -569,8 +589,6 @@ def regex(client: Client, message: Message) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Regex error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
 
@@ -656,10 +674,7 @@ def reset_words(client: Client, message: Message) -> bool:
         command_type = get_command_type(message)
 
         if command_type in glovar.regex:
-            for word in list(eval(f"glovar.{command_type}_words")):
-                eval(f"glovar.{command_type}_words")[word] = deepcopy(glovar.default_word_status)
-
-            save(f"{command_type}_words")
+            rules.reset(command_type)
 
             text += f"{lang('type')}{lang('colon')}{code(lang(command_type))}\n"
 
@@ -669,10 +684,7 @@ def reset_words(client: Client, message: Message) -> bool:
             text += f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n"
         elif command_type == "all":
             for word_type in glovar.regex:
-                for word in list(eval(f"glovar.{word_type}_words")):
-                    eval(f"glovar.{word_type}_words")[word] = deepcopy(glovar.default_word_status)
-
-                save(f"{word_type}_words")
+                rules.reset(word_type)
 
             text += (f"{lang('type')}{lang('colon')}{code(lang('all'))}\n"
                      f"{lang('status')}{lang('colon')}{code(lang('status_succeeded'))}\n")
@@ -789,7 +801,6 @@ def same_words(client: Client, message: Message) -> bool:
                    & from_user)
 def search_words(client: Client, message: Message) -> bool:
     # Search words
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = message.chat.id
@@ -802,8 +813,6 @@ def search_words(client: Client, message: Message) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Search words error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
 
@@ -829,24 +838,8 @@ def text_t2t(client: Client, message: Message) -> bool:
 
         if message.reply_to_message:
             # Regenerate special characters dictionary if possible
-            for file_name in {"spc_words", "spe_words"}:
-                special = file_name.split("_")[0]
-                exec(f"glovar.{special}_dict = {{}}")
-
-                for rule in list(eval(f"glovar.{file_name}")):
-                    # Check keys
-                    if "[" not in rule:
-                        continue
-
-                    # Check value
-                    if "?#" not in rule:
-                        continue
-
-                    keys = rule.split("]")[0][1:]
-                    value = rule.split("?#")[1][1]
-
-                    for k in keys:
-                        eval(f"glovar.{special}_dict")[k] = value
+            for special in ["spc", "spe"]:
+                setattr(glovar, f"{special}_dict", glovar.load_special(special))
 
             result = ""
 
@@ -942,7 +935,6 @@ def version(client: Client, message: Message) -> bool:
                    & from_user)
 def who(client: Client, message: Message) -> bool:
     # Find who add the word
-    glovar.locks["regex"].acquire()
     try:
         # Basic data
         cid = message.chat.id
@@ -957,7 +949,7 @@ def who(client: Client, message: Message) -> bool:
         word_type, word = get_command_context(message)
 
         if word_type and word_type in glovar.regex and word:
-            words = eval(f"glovar.{word_type}_words")
+            words = get_snapshot(word_type)
 
             text += f"{lang('type')}{lang('colon')}{code(lang(word_type))}\n"
 
@@ -984,7 +976,5 @@ def who(client: Client, message: Message) -> bool:
         return True
     except Exception as e:
         logger.warning(f"Who error: {e}", exc_info=True)
-    finally:
-        glovar.locks["regex"].release()
 
     return False
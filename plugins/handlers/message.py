@@ -23,7 +23,8 @@ from pyrogram import Client, Filters, Message
 from .. import glovar
 from ..functions.etc import code, general_link, lang, thread
 from ..functions.filters import aio, exchange_channel, from_user, hide_channel, test_group
-from ..functions.receive import receive_captcha_data, receive_count, receive_status_ask, receive_text_data
+from ..functions.receive import receive_captcha_data, receive_count, receive_regex_ack, receive_regex_request
+from ..functions.receive import receive_status_ask, receive_text_data
 from ..functions.telegram import send_message
 from ..functions.tests import name_test, sticker_test, text_test
 
@@ -92,6 +93,15 @@ def process_data(client: Client, message: Message) -> bool:
         receivers = data["to"]
         action = data["action"]
         action_type = data["type"]
+
+        # The sender can decompress the files
+        if "compress" in data:
+            glovar.decompressors.add(sender)
+
+        # The sender can apply the delta and bundle updates
+        if action == "regex" and action_type in {"ack", "request"}:
+            glovar.deltas.add(sender)
+
         data = data["data"]
 
         # This will look awkward,
@@ -100,7 +110,15 @@ def process_data(client: Client, message: Message) -> bool:
         # so it is intentionally written like this
         if glovar.sender in receivers:
 
-            if sender == "CAPTCHA":
+            if sender == "AVATAR":
+
+                if action == "regex":
+                    if action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
+
+            elif sender == "CAPTCHA":
 
                 if action == "captcha":
                     if action_type == "result":
@@ -109,54 +127,98 @@ def process_data(client: Client, message: Message) -> bool:
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "CLEAN":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "LANG":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "LONG":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "NOFLOOD":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "NOPORN":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "NOSPAM":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "RECHECK":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
+
+            elif sender == "TIP":
+
+                if action == "regex":
+                    if action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "WATCH":
 
                 if action == "regex":
                     if action_type == "count":
                         receive_count(client, message, data)
+                    elif action_type == "request":
+                        receive_regex_request(client, sender, data)
+                    elif action_type == "ack":
+                        receive_regex_ack(sender, data)
 
             elif sender == "MANAGE":
 